@@ -0,0 +1,321 @@
+"""
+Benchmark harness for epg_translator.
+
+Generates synthetic XMLTV feeds and runs them through the translation pipeline
+(parse and filter -> detect -> translate -> serialize) against the offline mock backend, so that
+results do not depend on the network. Each scenario runs in its own process so that
+peak RSS figures are not polluted by previous scenarios.
+
+Examples:
+    python benchmark.py
+    python benchmark.py --channels 50 --programmes-per-day 48 --days 7 --duplication 0.8
+    python benchmark.py --sizes 10,100,500 --save bench_baseline.json
+    python benchmark.py --sizes 10,100,500 --compare bench_baseline.json
+    python benchmark.py --channels 500 --shards 8
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import shutil
+import tempfile
+import subprocess
+import contextlib
+from datetime import datetime, timedelta
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# Small word pools per language, used to build programme titles and descriptions
+WORDS = {
+    'sr': ['vijesti', 'dnevnik', 'sport', 'film', 'serija', 'emisija', 'muzika', 'priča', 'grad', 'vreme', 'jutro', 'veče'],
+    'ru': ['новости', 'спорт', 'фильм', 'сериал', 'передача', 'музыка', 'утро', 'вечер', 'город', 'погода', 'история', 'жизнь'],
+    'zh': ['新闻', '体育', '电影', '电视剧', '节目', '音乐', '早晨', '晚上', '城市', '天气', '故事', '生活'],
+    'tr': ['haberler', 'spor', 'film', 'dizi', 'program', 'müzik', 'sabah', 'akşam', 'şehir', 'hava', 'hikaye', 'hayat'],
+    'en': ['news', 'sport', 'movie', 'series', 'show', 'music', 'morning', 'evening', 'city', 'weather', 'story', 'life'],
+}
+CATEGORIES = ['News', 'Sport', 'Movie', 'Series', 'Kids', 'Music', 'Documentary']
+
+
+# ================= SYNTHETIC FEED ================= #
+
+def make_text(rng, words, n_words):
+    return ' '.join(rng.choice(words) for _ in range(n_words)).capitalize()
+
+
+def generate_feed(path, channels, programmes_per_day, days, duplication, languages, seed=0):
+    """
+    Write a synthetic XMLTV feed to path.
+
+    Programmes start one hour in the past and cover `days` days. `duplication` is the
+    probability that a programme reuses a title/description already used on its channel,
+    which is how real feeds repeat series titles across episodes and days.
+    """
+    from xml.sax.saxutils import escape, quoteattr
+
+    rng = random.Random(seed)
+    now = datetime.utcnow().replace(minute=0, second=0, microsecond=0) - timedelta(hours=1)
+    slot = timedelta(minutes=24 * 60 // max(1, programmes_per_day))
+    fmt = "%Y%m%d%H%M%S +0000"
+    n_programmes = 0
+
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<tv generator-info-name="epg_translator benchmark">\n')
+        for c in range(channels):
+            lang = languages[c % len(languages)]
+            f.write(f'  <channel id="bench{c}.{lang}"><display-name>{escape(make_text(rng, WORDS[lang], 2))} {c}</display-name></channel>\n')
+
+        for c in range(channels):
+            lang = languages[c % len(languages)]
+            words = WORDS[lang]
+            seen = []
+            start = now
+            for _ in range(programmes_per_day * days):
+                if seen and rng.random() < duplication:
+                    title, desc = rng.choice(seen)
+                else:
+                    title = make_text(rng, words, rng.randint(1, 4))
+                    desc = make_text(rng, words, rng.randint(8, 30)) + '.'
+                    seen.append((title, desc))
+                stop = start + slot
+                f.write(
+                    f'  <programme channel={quoteattr(f"bench{c}.{lang}")} start="{start.strftime(fmt)}" stop="{stop.strftime(fmt)}">'
+                    f'<title>{escape(title)}</title><desc>{escape(desc)}</desc>'
+                    f'<category>{rng.choice(CATEGORIES)}</category><country>{lang.upper()}</country></programme>\n'
+                )
+                start = stop
+                n_programmes += 1
+        f.write('</tv>\n')
+
+    return n_programmes
+
+
+# ================= PIPELINE ================= #
+
+def peak_rss_mb(who=None):
+    """Peak RSS of this process, or with who=RUSAGE_CHILDREN of its largest finished child (e.g. a shard worker)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF if who is None else who).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return round(peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024, 1)
+
+
+def import_translator(args):
+    """Import epg_translator, load the benchmark config into it, then override settings."""
+    import epg_translator as et
+    et.configure(et.load_config(args.config))
+    et.PRIMARY_BACKEND = 'mock'
+    et.FALLBACK_BACKEND = 'mock' if args.fallback else ''
+    et.ENABLE_CHATGPT_FALLBACK = args.fallback
+    et.TRANSLATION_CACHE_FILE = ''
+    et.KNOWN_IDENTITY_FILE = ''
+    et.FALLBACK_ROUTING = {rule.strip() for rule in args.routing.split(',') if rule.strip()}
+    et.INCREMENTAL_MODE = False
+    et.MOCK_LATENCY_MS = args.latency_ms
+    et.MOCK_FAILURE_RATE = args.failure_rate
+    et.MOCK_IDENTITY_RATE = args.identity_rate
+    et.NUM_WORKERS = args.workers
+    et.GOOGLE_MAX_CONCURRENCY = args.workers
+    et.BATCH_SIZE = args.batch_size
+    et.SHARD_PROCESSES = args.shards
+    et.LOOKAHEAD_HOURS = args.lookahead_hours
+    return et
+
+
+def run_scenario(args):
+    """Generate one feed, run it through the pipeline and return the measurements."""
+    start = time.perf_counter()
+    et = import_translator(args)
+    import_s = time.perf_counter() - start
+    languages = args.languages.split(',')
+    timings = {}
+    workdir = tempfile.mkdtemp(prefix='epg_bench_')
+    feed_path = os.path.join(workdir, 'feed.xml')
+
+    start = time.perf_counter()
+    n_programmes = generate_feed(feed_path, args.channels, args.programmes_per_day, args.days,
+                                 args.duplication, languages, args.seed)
+    timings['generate'] = time.perf_counter() - start
+    feed_bytes = os.path.getsize(feed_path)
+    backend = et.get_backend('mock')
+    stats = {}
+
+    with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+        if args.shards > 1:
+            # Sharded mode also runs all stages at once; the worker pool is started outside the timing
+            out_path = os.path.join(workdir, 'out.xml')
+            et.get_shard_pool().submit(int).result()
+            start = time.perf_counter()
+            et.translate_xml_sharded(feed_path, out_path, None, 'benchmark', {}, stats=stats)
+            timings['translate'] = time.perf_counter() - start
+            et.shutdown_shard_pool()
+            output_bytes = os.path.getsize(out_path)
+        elif args.streaming:
+            # Streaming mode interleaves all stages; it is reported as a single translate stage
+            out_path = os.path.join(workdir, 'out.xml')
+            start = time.perf_counter()
+            et.translate_xml_stream(feed_path, out_path, None, 'benchmark', {}, stats=stats)
+            timings['translate'] = time.perf_counter() - start
+            output_bytes = os.path.getsize(out_path)
+        else:
+            # Parsing includes the channel / time window filters, which drop programmes as they are read
+            start = time.perf_counter()
+            policy = et.get_window_policy('benchmark')
+            root, _ = et.parse_pruned(et.read_local_xml(feed_path), None, policy)
+            timings['parse'] = time.perf_counter() - start
+
+            # Language detection and queueing of the fields to translate, like the translator's detect stage
+            start = time.perf_counter()
+            queue = et.collect_tree_elements(root, policy, et.WorkQueue(args.fallback))
+            timings['detect'] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            et.translate_elements(queue, 'benchmark', stats)
+            timings['translate'] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            output = et.ET.tostring(root, encoding='utf-8')
+            timings['serialize'] = time.perf_counter() - start
+            output_bytes = len(output)
+
+    shutil.rmtree(workdir, ignore_errors=True)
+    worker_rss_mb = peak_rss_mb(resource.RUSAGE_CHILDREN) if resource is not None and args.shards > 1 else None
+    pipeline_s = sum(v for k, v in timings.items() if k != 'generate')
+    elements = stats.get('elements', 0)
+    return {
+        'scenario': scenario_name(args),
+        'params': {
+            'channels': args.channels, 'programmes_per_day': args.programmes_per_day, 'days': args.days,
+            'duplication': args.duplication, 'languages': languages, 'streaming': args.streaming,
+            'lookahead_hours': args.lookahead_hours, 'workers': args.workers, 'shards': args.shards, 'batch_size': args.batch_size, 'latency_ms': args.latency_ms,
+            'failure_rate': args.failure_rate, 'identity_rate': args.identity_rate, 'fallback': args.fallback,
+            'routing': args.routing,
+        },
+        'programmes': n_programmes,
+        'feed_mb': round(feed_bytes / (1024 * 1024), 2),
+        'output_mb': round(output_bytes / (1024 * 1024), 2),
+        'stages_s': {k: round(v, 4) for k, v in timings.items()},
+        'pipeline_s': round(pipeline_s, 4),
+        'import_s': round(import_s, 4),
+        # Shard workers are shut down (and waited for) above, so RUSAGE_CHILDREN covers them
+        'peak_rss_mb': max(peak_rss_mb(), worker_rss_mb or 0) if resource is not None else None,
+        'worker_peak_rss_mb': worker_rss_mb,
+        'texts': elements,
+        'unique_texts': stats.get('unique_texts', 0),
+        'elements_per_s': round((n_programmes + args.channels) / pipeline_s, 1) if pipeline_s else None,
+        'batches': backend.requests,
+        'backend_texts': backend.texts,
+        'fallback_routed': stats.get('fallback_routed', 0),
+    }
+
+
+def scenario_name(args):
+    mode = f'shard{args.shards}' if args.shards > 1 else 'stream' if args.streaming else 'tree'
+    window = f"-ahead{args.lookahead_hours:g}h" if args.lookahead_hours != 48 else ""
+    return f"{mode}-c{args.channels}-p{args.programmes_per_day}x{args.days}-dup{args.duplication}{window}"
+
+
+# ================= REPORTING ================= #
+
+def print_result(result):
+    stages = ', '.join(f"{k} {v:.3f}s" for k, v in result['stages_s'].items())
+    print(f"📊 {result['scenario']}: {result['programmes']} programmes ({result['feed_mb']} MB)")
+    print(f"    ⏱️ {stages} | pipeline {result['pipeline_s']:.3f}s | import {result['import_s']:.3f}s")
+    workers = f" (largest shard worker {result['worker_peak_rss_mb']} MB)" if result.get('worker_peak_rss_mb') else ""
+    print(f"    🚀 {result['elements_per_s']} elements/s | 🧠 peak RSS {result['peak_rss_mb']} MB{workers}")
+    print(f"    🔁 {result['texts']} texts, {result['unique_texts']} unique | 📦 {result['batches']} batches, {result['backend_texts']} texts sent"
+          f" | 🚦 {result['fallback_routed']} kept from fallback")
+
+
+def compare(results, baseline_path, tolerance):
+    """Print the change of each metric against a saved baseline. Returns False on any regression beyond tolerance."""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {r['scenario']: r for r in json.load(f)['results']}
+
+    ok = True
+    for result in results:
+        base = baseline.get(result['scenario'])
+        if base is None:
+            print(f"⚠️ {result['scenario']}: not in baseline {baseline_path}")
+            continue
+        for metric in ('pipeline_s', 'peak_rss_mb', 'worker_peak_rss_mb', 'batches'):
+            old, new = base.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            regressed = change > tolerance
+            ok = ok and not regressed
+            print(f"{'❌' if regressed else '✅'} {result['scenario']} {metric}: {old} -> {new} ({change:+.1%})")
+    return ok
+
+
+# ================= MAIN ================= #
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark the epg_translator pipeline on synthetic XMLTV feeds.")
+    parser.add_argument("--channels", type=int, default=20, help="Number of channels")
+    parser.add_argument("--sizes", help="Comma-separated channel counts to run one scenario each (overrides --channels)")
+    parser.add_argument("--programmes-per-day", type=int, default=24, help="Programmes per channel and day")
+    parser.add_argument("--days", type=int, default=7, help="Number of days in the feed")
+    parser.add_argument("--duplication", type=float, default=0.7, help="Probability that a programme repeats an earlier title/description (0-1)")
+    parser.add_argument("--languages", default="sr,ru,zh,tr,en", help=f"Comma-separated languages, among: {','.join(WORDS)}")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the generator")
+    parser.add_argument("--streaming", action="store_true", help="Use the streaming pipeline (STREAMING_MODE)")
+    parser.add_argument("--shards", type=int, default=1, help="Worker processes for the sharded pipeline (SHARD_PROCESSES)")
+    parser.add_argument("--lookahead-hours", type=float, default=48, help="Hours of programmes kept and translated (LOOKAHEAD_HOURS)")
+    parser.add_argument("--workers", type=int, default=4, help="Translation workers")
+    parser.add_argument("--batch-size", type=int, default=500, help="Texts per batch (BATCH_SIZE)")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Simulated latency per backend request")
+    parser.add_argument("--failure-rate", type=float, default=0, help="Share of backend requests failing (0-1)")
+    parser.add_argument("--identity-rate", type=float, default=0, help="Share of texts returned unchanged (0-1)")
+    parser.add_argument("--fallback", action="store_true", help="Send unchanged texts to a mock fallback backend")
+    parser.add_argument("--routing", default="code, known", help="FALLBACK_ROUTING rules keeping texts away from the fallback ('' for none)")
+    parser.add_argument("-c", "--config", default=os.devnull, help="epg_translator config file to start from (default: none)")
+    parser.add_argument("--save", help="Save results as a JSON baseline to this path")
+    parser.add_argument("--compare", help="Compare results against a JSON baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression when comparing (default 0.2)")
+    parser.add_argument("--single", action="store_true", help=argparse.SUPPRESS)
+    return parser
+
+
+def main():
+    parser = build_parser()
+    args = parser.parse_args()
+
+    if args.single:
+        # Child process: run one scenario and hand the result back as JSON
+        print(json.dumps(run_scenario(args)))
+        return 0
+
+    sizes = [int(s) for s in args.sizes.split(',')] if args.sizes else [args.channels]
+    child_argv = sys.argv[1:]
+    results = []
+    for size in sizes:
+        cmd = [sys.executable, os.path.abspath(__file__), *child_argv, '--channels', str(size), '--single']
+        proc = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8')
+        if proc.returncode != 0:
+            print(f"[ERROR] ❌ Scenario with {size} channels failed:\n{proc.stderr}")
+            return 1
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        print_result(result)
+        results.append(result)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({'created': datetime.utcnow().isoformat(timespec='seconds') + 'Z', 'results': results}, f, indent=2)
+        print(f"💾 Saved baseline to: {args.save}")
+
+    if args.compare and not compare(results, args.compare, args.tolerance):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,17 +1,29 @@
 import os
-import requests
-import openai
 from pathlib import Path
 from xml.etree import ElementTree as ET
-from langdetect import detect
-from deep_translator import GoogleTranslator,ChatGptTranslator
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from urllib.parse import urlparse
-from collections import defaultdict
+from collections import Counter, defaultdict
 from datetime import datetime, timedelta
-from typing import List, Tuple
+from typing import List
+from functools import lru_cache
 import time
 import argparse
+import sqlite3
+import threading
+import tempfile
+import json
+import gzip
+import lzma
+import zlib
+from xml.sax.saxutils import escape, quoteattr, unescape
+import re
+import mmap
+import shutil
+import contextlib
+import sys
+import unicodedata
+from array import array
 
 
 # ================= CONFIG LOADER ================= #
@@ -44,65 +56,950 @@ def load_config(config_path):
     return config
 
 
+def parse_language_list(value):
+    """Parse "en,fr" as well as the "{'en', 'fr'}" form used in config.txt into a set of language codes."""
+    codes = (code.strip().strip('\'"') for code in str(value).strip('{}[]() ').split(','))
+    return {code for code in codes if code}
 
-# ---- Parse CLI Arguments ---- #
-parser = argparse.ArgumentParser()
-parser.add_argument("-c", "--config", help="Path to configuration file", default="config.txt")
-args = parser.parse_args()
 
-# ---- Load configuration ---- #
-cfg = load_config(args.config) if os.path.exists(args.config) else {}
+def parse_field_list(value):
+    """Parse "title:168, desc:24, category" into {field: hours or None}, keeping the order."""
+    fields = {}
+    for item in str(value).split(','):
+        name, _, hours = item.partition(':')
+        if name.strip():
+            fields[name.strip()] = float(hours) if hours.strip() else None
+    return fields
 
-# ---- Assign configuration variables ---- #
-URL_LIST_FILE = cfg.get('URL_LIST_FILE', 'epg_urls.txt')
-LOCAL_PATHS_FILE = cfg.get('LOCAL_PATHS_FILE', 'local_epg_paths.txt')
-URL_FILTER_FILE = cfg.get('URL_FILTER_FILE', 'url_channel_filters.txt')
-LOCAL_FILTER_FILE = cfg.get('LOCAL_FILTER_FILE', 'local_channel_filters.txt')
-OUTPUT_FOLDER = cfg.get('OUTPUT_FOLDER', 'translated_epg_xmls')
-SKIP_LANGUAGES = set(cfg.get('SKIP_LANGUAGES', 'en,fr,es,it').split(','))
-NUM_WORKERS = int(cfg.get('NUM_WORKERS', 1))
-OPENAI_KEY = cfg.get('OPENAI_KEY', '')
-ENABLE_CHATGPT_FALLBACK = bool(cfg.get('ENABLE_CHATGPT_FALLBACK', False))
-BATCH_SIZE = int(cfg.get('BATCH_SIZE', 500))
-BATCH_SIZE_CHATGPT = int(cfg.get('BATCH_SIZE_CHATGPT', 50))
-TARGET_LANGUAGE = cfg.get('TARGET_LANGUAGE', 'en')
+
+# ================= SETTINGS ================= #
+
+def configure(cfg):
+    """
+    Set the module settings from a loaded config dict; keys missing from cfg get their defaults.
+    Called with {} at import time so that importing the module reads neither argv nor config.txt.
+    """
+    global URL_LIST_FILE, LOCAL_PATHS_FILE, URL_FILTER_FILE, LOCAL_FILTER_FILE, OUTPUT_FOLDER
+    global SKIP_LANGUAGES, NUM_WORKERS, OPENAI_KEY, ENABLE_CHATGPT_FALLBACK, BATCH_SIZE
+    global BATCH_SIZE_CHATGPT, BATCH_MAX_CHARS, BATCH_MAX_TOKENS_CHATGPT, LONG_TEXT_CHARS
+    global TARGET_LANGUAGE, TRANSLATION_CACHE_FILE, TRANSLATION_CACHE_MAX_ENTRIES, STREAMING_MODE
+    global STREAM_WINDOW_SIZE, INCREMENTAL_MODE, MAX_CONCURRENT_DOWNLOADS
+    global MAX_CONCURRENT_TRANSLATIONS, DOWNLOAD_STATE_FILE, DOWNLOAD_FOLDER, GOOGLE_MAX_CONCURRENCY
+    global GOOGLE_RATE_LIMIT, GOOGLE_TARGET_LATENCY, CHATGPT_MAX_CONCURRENCY, CHATGPT_RATE_LIMIT
+    global CHATGPT_TARGET_LATENCY, PRIMARY_BACKEND, FALLBACK_BACKEND, MOCK_LATENCY_MS
+    global MOCK_FAILURE_RATE, MOCK_IDENTITY_RATE, LANGUAGE_DETECTION, LANGUAGE_PRIOR_SAMPLE
+    global LANGUAGE_DETECTION_MIN_CHARS, LANGUAGE_DETECTION_MIN_CONFIDENCE, CROSS_SOURCE_DEDUP, MERGED_OUTPUT_FILE, SHARD_PROCESSES
+    global REFRESH_INTERVAL_MINUTES, REFRESH_SCHEDULE_FILE, DAEMON_POLL_SECONDS, METRICS_FILE
+    global PROMETHEUS_FILE
+    global CHECKPOINT_FOLDER, LOOKAHEAD_HOURS, PAST_GRACE_HOURS, CHANNEL_FIELDS, PROGRAMME_FIELDS
+    global WINDOW_POLICY_FILE, FALLBACK_ROUTING, KNOWN_IDENTITY_FILE, TRANSLATABLE_TAGS
+    global download_slots, translation_slots
+    URL_LIST_FILE = cfg.get('URL_LIST_FILE', 'epg_urls.txt')
+    LOCAL_PATHS_FILE = cfg.get('LOCAL_PATHS_FILE', 'local_epg_paths.txt')
+    URL_FILTER_FILE = cfg.get('URL_FILTER_FILE', 'url_channel_filters.txt')
+    LOCAL_FILTER_FILE = cfg.get('LOCAL_FILTER_FILE', 'local_channel_filters.txt')
+    OUTPUT_FOLDER = cfg.get('OUTPUT_FOLDER', 'translated_epg_xmls')
+    SKIP_LANGUAGES = parse_language_list(cfg.get('SKIP_LANGUAGES', 'en,fr,es,it'))
+    NUM_WORKERS = int(cfg.get('NUM_WORKERS', 1))
+    OPENAI_KEY = cfg.get('OPENAI_KEY', '')
+    ENABLE_CHATGPT_FALLBACK = bool(cfg.get('ENABLE_CHATGPT_FALLBACK', False))
+    BATCH_SIZE = int(cfg.get('BATCH_SIZE', 500))
+    BATCH_SIZE_CHATGPT = int(cfg.get('BATCH_SIZE_CHATGPT', 50))
+    BATCH_MAX_CHARS = int(cfg.get('BATCH_MAX_CHARS', 30000))
+    BATCH_MAX_TOKENS_CHATGPT = int(cfg.get('BATCH_MAX_TOKENS_CHATGPT', 3000))
+    LONG_TEXT_CHARS = int(cfg.get('LONG_TEXT_CHARS', 300))
+    TARGET_LANGUAGE = cfg.get('TARGET_LANGUAGE', 'en')
+    TRANSLATION_CACHE_FILE = cfg.get('TRANSLATION_CACHE_FILE', 'translation_cache.sqlite')
+    TRANSLATION_CACHE_MAX_ENTRIES = int(cfg.get('TRANSLATION_CACHE_MAX_ENTRIES', 500000))
+    STREAMING_MODE = bool(cfg.get('STREAMING_MODE', False))
+    STREAM_WINDOW_SIZE = int(cfg.get('STREAM_WINDOW_SIZE', 5000))
+    INCREMENTAL_MODE = bool(cfg.get('INCREMENTAL_MODE', False))
+    MAX_CONCURRENT_DOWNLOADS = max(1, int(cfg.get('MAX_CONCURRENT_DOWNLOADS', 4)))
+    MAX_CONCURRENT_TRANSLATIONS = max(1, int(cfg.get('MAX_CONCURRENT_TRANSLATIONS', 1)))
+    DOWNLOAD_STATE_FILE = cfg.get('DOWNLOAD_STATE_FILE', 'download_state.json')
+    DOWNLOAD_FOLDER = cfg.get('DOWNLOAD_FOLDER', 'downloads')
+    # NUM_WORKERS is only where the adaptive limit starts; it grows up to this ceiling while Google keeps up
+    GOOGLE_MAX_CONCURRENCY = max(1, NUM_WORKERS, int(cfg.get('GOOGLE_MAX_CONCURRENCY', 8)))
+    GOOGLE_RATE_LIMIT = float(cfg.get('GOOGLE_RATE_LIMIT', 0))
+    GOOGLE_TARGET_LATENCY = float(cfg.get('GOOGLE_TARGET_LATENCY', 1.0))
+    CHATGPT_MAX_CONCURRENCY = max(1, int(cfg.get('CHATGPT_MAX_CONCURRENCY', 1)))
+    CHATGPT_RATE_LIMIT = float(cfg.get('CHATGPT_RATE_LIMIT', 0))
+    CHATGPT_TARGET_LATENCY = float(cfg.get('CHATGPT_TARGET_LATENCY', 5.0))
+    PRIMARY_BACKEND = cfg.get('PRIMARY_BACKEND', 'google')
+    FALLBACK_BACKEND = cfg.get('FALLBACK_BACKEND', 'chatgpt')
+    MOCK_LATENCY_MS = float(cfg.get('MOCK_LATENCY_MS', 0))
+    MOCK_FAILURE_RATE = float(cfg.get('MOCK_FAILURE_RATE', 0))
+    MOCK_IDENTITY_RATE = float(cfg.get('MOCK_IDENTITY_RATE', 0))
+    LANGUAGE_DETECTION = bool(cfg.get('LANGUAGE_DETECTION', True))
+    LANGUAGE_PRIOR_SAMPLE = int(cfg.get('LANGUAGE_PRIOR_SAMPLE', 20))
+    LANGUAGE_DETECTION_MIN_CHARS = int(cfg.get('LANGUAGE_DETECTION_MIN_CHARS', 20))
+    LANGUAGE_DETECTION_MIN_CONFIDENCE = float(cfg.get('LANGUAGE_DETECTION_MIN_CONFIDENCE', 0.95))
+    CROSS_SOURCE_DEDUP = bool(cfg.get('CROSS_SOURCE_DEDUP', False))
+    MERGED_OUTPUT_FILE = cfg.get('MERGED_OUTPUT_FILE', '')
+    SHARD_PROCESSES = max(1, int(cfg.get('SHARD_PROCESSES', 1)))
+    REFRESH_INTERVAL_MINUTES = float(cfg.get('REFRESH_INTERVAL_MINUTES', 360))
+    REFRESH_SCHEDULE_FILE = cfg.get('REFRESH_SCHEDULE_FILE', 'refresh_schedule.txt')
+    DAEMON_POLL_SECONDS = max(1, int(cfg.get('DAEMON_POLL_SECONDS', 30)))
+    METRICS_FILE = cfg.get('METRICS_FILE', '')
+    PROMETHEUS_FILE = cfg.get('PROMETHEUS_FILE', '')
+    CHECKPOINT_FOLDER = cfg.get('CHECKPOINT_FOLDER', 'checkpoints')
+    LOOKAHEAD_HOURS = float(cfg.get('LOOKAHEAD_HOURS', 48))
+    PAST_GRACE_HOURS = float(cfg.get('PAST_GRACE_HOURS', 0))
+    CHANNEL_FIELDS = parse_field_list(cfg.get('CHANNEL_FIELDS', 'display-name'))
+    PROGRAMME_FIELDS = parse_field_list(cfg.get('PROGRAMME_FIELDS', 'title, desc, category, country'))
+    WINDOW_POLICY_FILE = cfg.get('WINDOW_POLICY_FILE', 'window_policy.txt')
+    FALLBACK_ROUTING = {rule.strip() for rule in str(cfg.get('FALLBACK_ROUTING', 'code, known')).split(',') if rule.strip()}
+    KNOWN_IDENTITY_FILE = cfg.get('KNOWN_IDENTITY_FILE', 'known_identity.jsonl')
+
+    # Fields translated for each top-level XMLTV element, unless a source's window policy says otherwise
+    TRANSLATABLE_TAGS = {'channel': set(CHANNEL_FIELDS), 'programme': set(PROGRAMME_FIELDS)}
+
+    download_slots = threading.BoundedSemaphore(MAX_CONCURRENT_DOWNLOADS)
+    translation_slots = threading.BoundedSemaphore(MAX_CONCURRENT_TRANSLATIONS)
+
+
+configure({})
+LANGUAGE_CACHE_MAX_ENTRIES = 200000
+
+# Set from the command line by main()
+DAEMON_MODE = False
+PROFILE_SOURCE = None
+
+
+# ================= TRANSLATION CACHE ================= #
+
+class TranslationCache:
+    """
+    Persistent translation memory stored in SQLite, shared across runs and sources.
+
+    Entries are keyed by (source text, target language, backend). Results that came back
+    unchanged are stored as well, so a text the primary backend already returned as-is goes
+    straight to the fallback step on the next run instead of being sent to it again.
+    """
+
+    # Stay well below SQLite's limit on bound parameters per statement
+    LOOKUP_CHUNK = 500
+
+    def __init__(self, path, max_entries):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS translations ("
+            " text TEXT NOT NULL, target TEXT NOT NULL, backend TEXT NOT NULL,"
+            " translation TEXT NOT NULL, last_used REAL NOT NULL,"
+            " PRIMARY KEY (text, target, backend))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_translations_last_used ON translations (last_used)")
+        self._conn.commit()
+
+    def get_many(self, texts, target, backend):
+        """Return a {text: translation} dict for the texts already in the cache."""
+        found = {}
+        unique = list(dict.fromkeys(t for t in texts if t))
+        with self._lock:
+            for i in range(0, len(unique), self.LOOKUP_CHUNK):
+                chunk = unique[i:i + self.LOOKUP_CHUNK]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT text, translation FROM translations"
+                    f" WHERE target = ? AND backend = ? AND text IN ({placeholders})",
+                    (target, backend, *chunk)
+                ).fetchall()
+                found.update(rows)
+
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE translations SET last_used = ? WHERE text = ? AND target = ? AND backend = ?",
+                    [(now, text, target, backend) for text in found]
+                )
+                self._conn.commit()
+        return found
+
+    def put_many(self, pairs, target, backend):
+        """Store (text, translation) pairs, skipping empty texts and empty translations."""
+        now = time.time()
+        rows = [(text, target, backend, translated, now) for text, translated in pairs if text and translated]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+
+    def evict(self):
+        """Trim the cache to max_entries, least recently used first. Returns the number of evicted entries."""
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+            excess = count - self.max_entries
+            if excess <= 0:
+                return 0
+            self._conn.execute(
+                "DELETE FROM translations WHERE rowid IN"
+                " (SELECT rowid FROM translations ORDER BY last_used LIMIT ?)",
+                (excess,)
+            )
+            self._conn.commit()
+        return excess
+
+
+_translation_cache = None
+_translation_cache_lock = threading.Lock()
+_stats_lock = threading.Lock()
+
+
+def get_translation_cache():
+    """
+    Open the shared translation cache on first use. Returns None when the cache is disabled.
+    In daemon mode without TRANSLATION_CACHE_FILE, an in-memory cache lives as long as the process.
+    """
+    global _translation_cache
+    path = TRANSLATION_CACHE_FILE or (':memory:' if DAEMON_MODE else '')
+    if not path:
+        return None
+    with _translation_cache_lock:
+        if _translation_cache is None:
+            try:
+                _translation_cache = TranslationCache(path, TRANSLATION_CACHE_MAX_ENTRIES)
+            except sqlite3.Error as e:
+                print(f"[ERROR] Failed to open translation cache {path}: {e}")
+                return None
+    return _translation_cache
+
+
+def bump_stat(stats, key, amount=1):
+    """Increment a per-source counter; stats may be None when the caller does not track them."""
+    if stats is None:
+        return
+    with _stats_lock:
+        stats[key] = stats.get(key, 0) + amount
+
+
+# ================= METRICS ================= #
+
+# Upper bounds (seconds) of the request latency histogram buckets
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, float('inf'))
+
+_source_stats = {}
+_source_stats_lock = threading.Lock()
+_metrics_file_lock = threading.Lock()
+
+
+def source_stats(source):
+    """Metrics dict of a source (URL or path), created on first use and kept until reset_source_stats."""
+    with _source_stats_lock:
+        return _source_stats.setdefault(source, {})
+
+
+def reset_source_stats(sources):
+    """Start fresh metrics for sources about to be processed; other sources keep their last values."""
+    with _source_stats_lock:
+        for source in sources:
+            _source_stats[source] = {}
+
+
+@contextlib.contextmanager
+def timed(stats, stage):
+    """Add the time spent in the block to stats['<stage>_seconds']."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        bump_stat(stats, f"{stage}_seconds", time.perf_counter() - start)
+
+
+def observe(stats, key, value):
+    """Record value in the latency histogram stats[key] ({'buckets': [...], 'sum': ..., 'count': ...})."""
+    if stats is None:
+        return
+    with _stats_lock:
+        histogram = stats.setdefault(key, {'buckets': [0] * len(LATENCY_BUCKETS), 'sum': 0.0, 'count': 0})
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                histogram['buckets'][i] += 1
+                break
+        histogram['sum'] += value
+        histogram['count'] += 1
+
+
+def record_source_metrics(source, ok):
+    """Append the metrics of a processed source to METRICS_FILE as one JSON line."""
+    stats = source_stats(source)
+    stats['ok'] = bool(ok)
+    if not METRICS_FILE:
+        return
+    values = {key: round(value, 4) if isinstance(value, float) else value for key, value in stats.items()}
+    line = json.dumps({'time': datetime.utcnow().isoformat(timespec='seconds') + 'Z', 'source': source, **values},
+                      ensure_ascii=False)
+    with _metrics_file_lock:
+        try:
+            with open(METRICS_FILE, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+        except OSError as e:
+            print(f"[WARN] Could not write metrics to {METRICS_FILE}: {e}")
+
+
+def prometheus_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def write_prometheus_metrics():
+    """
+    Write the latest metrics of every source to PROMETHEUS_FILE in the Prometheus text format,
+    for the node_exporter textfile collector. The file is replaced atomically.
+    """
+    if not PROMETHEUS_FILE:
+        return
+    with _source_stats_lock:
+        snapshot = {source: dict(stats) for source, stats in _source_stats.items()}
+
+    families = defaultdict(list)
+    for source, stats in snapshot.items():
+        label = f'source="{prometheus_label(source)}"'
+        for key, value in stats.items():
+            name = f"epg_translator_{re.sub(r'[^a-zA-Z0-9_]', '_', key)}"
+            if isinstance(value, dict):
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, value['buckets']):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else f"{bound:g}"
+                    families[(name, 'histogram')].append(f'{name}_bucket{{{label},le="{le}"}} {cumulative}')
+                families[(name, 'histogram')].append(f"{name}_sum{{{label}}} {value['sum']:.6f}")
+                families[(name, 'histogram')].append(f"{name}_count{{{label}}} {value['count']}")
+            else:
+                families[(name, 'gauge')].append(f"{name}{{{label}}} {float(value):g}")
+
+    lines = []
+    for (name, kind), samples in sorted(families.items()):
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(samples)
+    tmp_path = f"{PROMETHEUS_FILE}.part"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp_path, PROMETHEUS_FILE)
+    except OSError as e:
+        print(f"[WARN] Could not write Prometheus metrics to {PROMETHEUS_FILE}: {e}")
+
+
+# ================= RATE LIMITING ================= #
+
+class TokenBucket:
+    """
+    Thread-safe token bucket allowing `rate` texts per second on average, with bursts of up to `capacity`.
+    A rate of 0 disables the limit. Requests larger than the bucket are allowed but pay for the deficit.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1.0, self.rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount=1):
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+
+class AdaptiveLimiter:
+    """
+    AIMD limit on the number of in-flight requests to one translation backend.
+
+    The limit grows by one after a full window of fast successful requests (per-text latency
+    at or under target_latency) and is halved on errors and rate-limit (429) responses,
+    at most once per cooldown period so that one burst of failures counts once.
+    """
+
+    def __init__(self, name, initial, maximum, target_latency, cooldown=5.0):
+        self.name = name
+        self.maximum = max(1, maximum)
+        self.limit = min(max(1, initial), self.maximum)
+        self.target_latency = target_latency
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.texts_done = 0
+        self._successes = 0
+        self._last_decrease = 0.0
+        self._started = time.monotonic()
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= self.limit:
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, latency, n_texts, ok, throttled=False):
+        with self._cond:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if ok:
+                self.texts_done += n_texts
+            if not ok or throttled:
+                self._successes = 0
+                if now - self._last_decrease >= self.cooldown:
+                    self._last_decrease = now
+                    self.limit = max(1, self.limit // 2)
+                    print(f"🐢 {self.name} concurrency reduced to {self.limit} after {'rate limiting' if throttled else 'an error'}")
+            elif latency / max(1, n_texts) <= self.target_latency:
+                self._successes += 1
+                if self._successes >= self.limit and self.limit < self.maximum:
+                    self._successes = 0
+                    self.limit += 1
+            else:
+                self._successes = 0
+            self._cond.notify_all()
+
+    def throughput(self):
+        """Texts per second completed since the limiter was created."""
+        return self.texts_done / max(1e-6, time.monotonic() - self._started)
+
+    def describe(self):
+        return f"{self.name} concurrency {self.limit} ({self.in_flight} in flight), {self.throughput():.1f} texts/s"
+
+
+_backend_limits = {}
+_backend_limits_lock = threading.Lock()
+
+
+def get_backend_limits(backend):
+    """Return the shared (AdaptiveLimiter, TokenBucket) pair of a backend."""
+    with _backend_limits_lock:
+        if backend not in _backend_limits:
+            if backend == 'google':
+                limiter = AdaptiveLimiter('Google', NUM_WORKERS, GOOGLE_MAX_CONCURRENCY, GOOGLE_TARGET_LATENCY)
+                bucket = TokenBucket(GOOGLE_RATE_LIMIT)
+            elif backend == 'chatgpt':
+                limiter = AdaptiveLimiter('ChatGPT', 1, CHATGPT_MAX_CONCURRENCY, CHATGPT_TARGET_LATENCY)
+                bucket = TokenBucket(CHATGPT_RATE_LIMIT)
+            else:
+                # Offline backends: start at NUM_WORKERS and grow freely up to the Google ceiling
+                limiter = AdaptiveLimiter(backend.capitalize(), NUM_WORKERS, GOOGLE_MAX_CONCURRENCY, float('inf'))
+                bucket = TokenBucket(0)
+            _backend_limits[backend] = (limiter, bucket)
+        return _backend_limits[backend]
+
+
+def is_rate_limit_error(error):
+    """True for HTTP 429 / quota style errors raised by the translation libraries."""
+    text = f"{type(error).__name__} {error}".lower()
+    return '429' in text or 'too many requests' in text or 'toomanyrequests' in text or 'rate limit' in text
+
+
+def call_with_limits(backend, texts, func):
+    """Run func(texts) under the backend's adaptive concurrency limit and rate limit."""
+    limiter, bucket = get_backend_limits(backend)
+    limiter.acquire()
+    start = time.monotonic()
+    ok = throttled = False
+    try:
+        bucket.acquire(len(texts))
+        result = func(texts)
+        ok = True
+        return result
+    except Exception as e:
+        throttled = is_rate_limit_error(e)
+        raise
+    finally:
+        limiter.release(time.monotonic() - start, len(texts), ok, throttled)
+
+
+# ================= BATCH PACKING ================= #
+
+def estimate_tokens(text):
+    """Rough token count: about 4 characters per token for Latin text, one per character otherwise."""
+    ascii_chars = sum(1 for c in text if ord(c) < 128)
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars) + 1
+
+
+def pack_batches(items, text_of, max_items, max_size, size_of=len, long_text_size=0):
+    """
+    Group items into batches of at most max_items items and max_size total size (size_of(text)).
+
+    Texts of at least long_text_size characters (long descriptions) are packed into their own
+    lane, so they neither crowd out short titles nor get stuck behind them. An item larger than
+    max_size on its own still gets a batch of its own. Returns a list of lists of items.
+    """
+    short_lane, long_lane = [], []
+    for item in items:
+        text = text_of(item)
+        lane = long_lane if long_text_size and len(text) >= long_text_size else short_lane
+        lane.append((item, size_of(text)))
+
+    batches = []
+    for lane in (short_lane, long_lane):
+        batch, batch_size = [], 0
+        for item, size in lane:
+            if batch and (len(batch) >= max_items or batch_size + size > max_size):
+                batches.append(batch)
+                batch, batch_size = [], 0
+            batch.append(item)
+            batch_size += size
+        if batch:
+            batches.append(batch)
+    return batches
+
+
+# Halvings of a batch rejected for its size, so a backend rejecting everything costs at most 2^(n+1) - 1 requests
+MAX_SPLIT_DEPTH = 6
+
+
+def is_transient_error(error):
+    """True for connection errors, timeouts and unavailable servers: the backend is down, not the batch at fault."""
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    text = f"{type(error).__name__} {error}".lower()
+    return any(marker in text for marker in ('connection', 'timeout', 'timed out', 'unavailable', '502', '503', '504'))
+
+
+def is_size_error(error):
+    """True for errors blaming the size or content of a request (too long, invalid payload), which splitting it can fix."""
+    text = f"{type(error).__name__} {error}".lower()
+    return any(marker in text for marker in ('413', 'too long', 'too large', 'length', 'payload', 'maximum context'))
+
+
+def translate_with_split(backend, texts, max_retries=1, stats=None):
+    """
+    Translate texts with backend under its limits, returning one result (or None) per text.
+
+    Rate-limit errors, connection errors, timeouts and unknown errors are retried with backoff up
+    to max_retries attempts, after which the whole batch is given up. A batch rejected for its size
+    or payload is split in half and both halves are retried (at most MAX_SPLIT_DEPTH times), so one
+    oversized or malformed text costs a few items rather than the whole batch; the second half is
+    not tried when the first one had to be given up, e.g. because the backend went down meanwhile.
+    """
+    def request(batch):
+        start = time.perf_counter()
+        try:
+            return backend.translate_batch(batch, TARGET_LANGUAGE)
+        finally:
+            observe(stats, f"{backend.name}_latency_seconds", time.perf_counter() - start)
+
+    def translate(batch, depth):
+        """Returns (results, given_up)."""
+        attempt = 0
+        while True:
+            attempt += 1
+            bump_stat(stats, f"{backend.name}_requests")
+            bump_stat(stats, f"{backend.name}_request_texts", len(batch))
+            try:
+                return call_with_limits(backend.name, batch, request), False
+            except Exception as e:
+                throttled = is_rate_limit_error(e)
+                bump_stat(stats, f"{backend.name}_throttled" if throttled else f"{backend.name}_errors")
+                print(f"[ERROR] ❌ {backend.label} batch of {len(batch)} texts failed (attempt {attempt}/{max_retries}): {e}")
+                if not throttled and not is_transient_error(e) and is_size_error(e):
+                    if len(batch) == 1 or depth >= MAX_SPLIT_DEPTH:
+                        # Sending the same texts again would be rejected the same way
+                        return [None] * len(batch), False
+                    middle = len(batch) // 2
+                    print(f"    ✂️ Splitting into batches of {middle} and {len(batch) - middle} texts and retrying")
+                    bump_stat(stats, 'batch_splits')
+                    first, given_up = translate(batch[:middle], depth + 1)
+                    if given_up:
+                        return first + [None] * (len(batch) - middle), True
+                    second, given_up = translate(batch[middle:], depth + 1)
+                    return first + second, given_up
+                if attempt >= max_retries:
+                    if max_retries > 1:
+                        print("    ⛔ Max retries reached for this batch. Returning empty results.")
+                    return [None] * len(batch), True
+                bump_stat(stats, 'retries')
+                time.sleep(2 * attempt)  # exponential backoff
+
+    return translate(texts, 0)[0]
+
+
+# ================= TRANSLATION BACKENDS ================= #
+
+class TranslationBackend:
+    """
+    Interface of a translation backend.
+
+    - name: key used in config (PRIMARY_BACKEND / FALLBACK_BACKEND), the translation cache and rate limits
+    - label: name shown in the progress output
+    - capabilities: what the backend supports ('network', 'paid', 'max_chars' per text)
+    - cost_per_char: estimated cost in USD per source character, 0 for free backends
+    """
+
+    name = ''
+    label = ''
+    capabilities = {}
+    cost_per_char = 0.0
+
+    def __init__(self):
+        self._idle_clients = defaultdict(list)  # target -> clients not currently in use
+        self._clients_lock = threading.Lock()
+
+    def create_client(self, target):
+        """Build the library client translating to target, for backends that use one."""
+        raise NotImplementedError
+
+    @contextlib.contextmanager
+    def client(self, target):
+        """
+        Borrow a client for target, reusing an idle one so clients are built once and stay warm
+        across batches, sources and daemon refreshes. deep_translator clients keep per-request
+        state, so each one is only used by one thread at a time.
+        """
+        with self._clients_lock:
+            idle = self._idle_clients[target]
+            client = idle.pop() if idle else None
+        if client is None:
+            client = self.create_client(target)
+        try:
+            yield client
+        finally:
+            with self._clients_lock:
+                self._idle_clients[target].append(client)
+
+    def translate_batch(self, texts, target):
+        """Translate a list of texts to the target language, returning one result per text."""
+        raise NotImplementedError
+
+    def estimate_cost(self, texts):
+        return self.cost_per_char * sum(len(t) for t in texts)
+
+
+class GoogleBackend(TranslationBackend):
+    name = 'google'
+    label = 'Google'
+    capabilities = {'network': True, 'paid': False, 'max_chars': 5000}
+
+    def create_client(self, target):
+        from deep_translator import GoogleTranslator
+        return GoogleTranslator(source='auto', target=target)
+
+    def translate_batch(self, texts, target):
+        with self.client(target) as translator:
+            return translator.translate_batch(texts)
+
+
+class ChatGptBackend(TranslationBackend):
+    name = 'chatgpt'
+    label = 'ChatGPT'
+    capabilities = {'network': True, 'paid': True, 'max_chars': 5000}
+    # Rough estimate: ~4 characters per token, input and output tokens billed
+    cost_per_char = 0.000001
+
+    def create_client(self, target):
+        from deep_translator import ChatGptTranslator
+        return ChatGptTranslator(api_key=OPENAI_KEY, target=target)
+
+    def translate_batch(self, texts, target):
+        with self.client(target) as translator:
+            return translator.translate_batch(texts)
+
+
+class MockBackendError(Exception):
+    pass
+
+
+class MockBackend(TranslationBackend):
+    """
+    Deterministic offline backend for benchmarks and tests.
+
+    Texts are "translated" to "[target] text". Every request waits latency_ms; failure_rate
+    and identity_rate decide, from a hash of the texts, which requests fail with a 429 error
+    and which texts come back unchanged, so that runs are reproducible whatever the thread timing.
+    """
+
+    name = 'mock'
+    label = 'Mock'
+    capabilities = {'network': False, 'paid': False, 'max_chars': 5000}
+
+    def __init__(self, latency_ms=0, failure_rate=0.0, identity_rate=0.0):
+        super().__init__()
+        self.latency_ms = latency_ms
+        self.failure_rate = failure_rate
+        self.identity_rate = identity_rate
+        # Request counters, read by benchmark.py
+        self.requests = 0
+        self.texts = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _draw(text):
+        """Stable pseudo-random number in [0, 1) derived from text."""
+        return (zlib.crc32(text.encode('utf-8')) % 10000) / 10000
+
+    def translate_batch(self, texts, target):
+        with self._lock:
+            self.requests += 1
+            self.texts += len(texts)
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        if self.failure_rate and self._draw('\x00'.join(texts)) < self.failure_rate:
+            raise MockBackendError(f"Mock failure: 429 Too Many Requests ({len(texts)} texts)")
+        return [
+            text if not text or self._draw(text) < self.identity_rate else f"[{target}] {text}"
+            for text in texts
+        ]
+
+
+BACKEND_CLASSES = {
+    'google': GoogleBackend,
+    'chatgpt': ChatGptBackend,
+    'mock': MockBackend,
+}
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(name):
+    """Return the shared backend instance registered under name."""
+    with _backends_lock:
+        if name not in _backends:
+            if name not in BACKEND_CLASSES:
+                raise ValueError(f"Unknown translation backend '{name}' (available: {', '.join(BACKEND_CLASSES)})")
+            if name == 'mock':
+                _backends[name] = MockBackend(MOCK_LATENCY_MS, MOCK_FAILURE_RATE, MOCK_IDENTITY_RATE)
+            else:
+                _backends[name] = BACKEND_CLASSES[name]()
+        return _backends[name]
+
+
+def fallback_backend_enabled():
+    return bool(FALLBACK_BACKEND)
+
+
+# ================= LANGUAGE DETECTION ================= #
+
+_language_cache = {}
+_language_cache_lock = threading.Lock()
+_langdetect = None
+
+
+# Shortest title (in letters) used as a sample for a channel's language prior
+LANGUAGE_SAMPLE_MIN_CHARS = 4
+
+
+def get_langdetect():
+    """Import langdetect on first use, returning (detect_langs, LangDetectException)."""
+    global _langdetect
+    if _langdetect is None:
+        from langdetect import detect_langs, DetectorFactory
+        from langdetect.lang_detect_exception import LangDetectException
+        DetectorFactory.seed = 0  # make langdetect deterministic
+        _langdetect = (detect_langs, LangDetectException)
+    return _langdetect
+
+
+def detect_language_scored(text):
+    """(language, probability) of the most likely language of a text, cached by text for the whole run; (None, 0.0) when it cannot be told."""
+    with _language_cache_lock:
+        if text in _language_cache:
+            return _language_cache[text]
+
+    result = (None, 0.0)
+    if sum(c.isalpha() for c in text) >= LANGUAGE_SAMPLE_MIN_CHARS:
+        detect_langs, LangDetectException = get_langdetect()
+        try:
+            best = detect_langs(text)[0]
+            result = (best.lang, best.prob)
+        except (LangDetectException, IndexError):
+            pass
+
+    with _language_cache_lock:
+        if len(_language_cache) >= LANGUAGE_CACHE_MAX_ENTRIES:
+            _language_cache.clear()  # keeps a long-running daemon bounded
+        _language_cache[text] = result
+    return result
+
+
+def detect_language(text, min_chars=None):
+    """
+    Language of a text, or None when it cannot be told reliably: the text has fewer than min_chars
+    letters (LANGUAGE_DETECTION_MIN_CHARS by default) or no language reaches LANGUAGE_DETECTION_MIN_CONFIDENCE.
+    langdetect is often confidently wrong on short titles ("Crtani film" is Italian to it), hence both limits.
+    """
+    if sum(c.isalpha() for c in text) < (LANGUAGE_DETECTION_MIN_CHARS if min_chars is None else min_chars):
+        return None
+    lang, prob = detect_language_scored(text)
+    return lang if prob >= LANGUAGE_DETECTION_MIN_CONFIDENCE else None
+
+
+class LanguageClassifier:
+    """
+    Per-source pre-translation stage dropping texts already written in one of SKIP_LANGUAGES.
+
+    Detection results are cached by text. A text is only skipped on its own when it is long enough
+    for a reliable detection (see detect_language). Each channel also builds a language prior: once
+    its first LANGUAGE_PRIOR_SAMPLE titles were all confidently detected as the same language, the
+    rest of the channel's texts, short ones included, are classified from that prior without running
+    detection on each of them.
+    """
+
+    def __init__(self, stats=None):
+        self.stats = stats
+        self.samples = defaultdict(list)
+        self.priors = {}
+
+    def is_skippable(self, channel_id, field, text):
+        prior = self.priors.get(channel_id)
+        if prior is not None:
+            bump_stat(self.stats, 'language_prior_hits')
+            return prior in SKIP_LANGUAGES
+
+        bump_stat(self.stats, 'language_detections')
+        if field == 'title' and LANGUAGE_PRIOR_SAMPLE > 0 and sum(c.isalpha() for c in text) >= LANGUAGE_SAMPLE_MIN_CHARS:
+            # A title detected without confidence counts as a sample too, and rules the prior out
+            samples = self.samples[channel_id]
+            samples.append(detect_language(text, LANGUAGE_SAMPLE_MIN_CHARS))
+            if len(samples) >= LANGUAGE_PRIOR_SAMPLE:
+                if len(set(samples)) == 1 and samples[0] is not None:
+                    self.priors[channel_id] = samples[0]
+                del self.samples[channel_id]
+        return detect_language(text) in SKIP_LANGUAGES
+
+
+def report_language_skips(stats, log_source_name):
+    """Print how many texts the language stage dropped before translation."""
+    if LANGUAGE_DETECTION:
+        print(f"🗣️ {log_source_name}: skipped {stats.get('skipped_language', 0)} texts already in {sorted(SKIP_LANGUAGES)} "
+              f"({stats.get('language_detections', 0)} detections, {stats.get('language_prior_hits', 0)} decided by channel prior)")
 
 
 # ====================
 
-def download_xml(url):
+DOWNLOAD_OK = 'ok'
+DOWNLOAD_NOT_MODIFIED = 'not-modified'
+DOWNLOAD_FAILED = 'failed'
+
+GZIP_MAGIC = b'\x1f\x8b'
+XZ_MAGIC = b'\xfd7zXZ\x00'
+
+_http_session = None
+_http_session_lock = threading.Lock()
+_download_state = None
+_download_state_lock = threading.Lock()
+
+
+def get_http_session():
+    """Return the pooled requests.Session shared by all downloads."""
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=MAX_CONCURRENT_DOWNLOADS,
+                                  pool_maxsize=MAX_CONCURRENT_DOWNLOADS)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _http_session = session
+    return _http_session
+
+
+def load_download_state():
+    """Load the ETag / Last-Modified validators saved per URL by previous runs."""
+    global _download_state
+    with _download_state_lock:
+        if _download_state is None:
+            _download_state = {}
+            if DOWNLOAD_STATE_FILE and os.path.exists(DOWNLOAD_STATE_FILE):
+                try:
+                    with open(DOWNLOAD_STATE_FILE, 'r', encoding='utf-8') as f:
+                        _download_state = json.load(f)
+                except (OSError, ValueError) as e:
+                    print(f"[WARN] Ignoring unreadable download state {DOWNLOAD_STATE_FILE}: {e}")
+        return _download_state
+
+
+def remember_download_validators(url, validators):
+    """Save the validators of a feed once its translated output has been written."""
+    if not DOWNLOAD_STATE_FILE or not validators:
+        return
+    state = load_download_state()
+    with _download_state_lock:
+        state[url] = validators
+        tmp_path = f"{DOWNLOAD_STATE_FILE}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f, indent=2)
+            os.replace(tmp_path, DOWNLOAD_STATE_FILE)
+        except OSError as e:
+            print(f"[WARN] Could not save download state {DOWNLOAD_STATE_FILE}: {e}")
+
+
+def download_xml_to_file(url, dest_path, conditional=False):
+    """
+    Stream a remote EPG file to dest_path without holding it in memory.
+
+    When conditional is True, the ETag / Last-Modified validators of the previous download
+    are sent, and an unchanged feed is reported as DOWNLOAD_NOT_MODIFIED without transferring it.
+    Returns (status, validators), validators being the values to save once the feed is processed.
+    """
+    headers = {}
+    if conditional and DOWNLOAD_STATE_FILE:
+        previous = load_download_state().get(url, {})
+        if previous.get('etag'):
+            headers['If-None-Match'] = previous['etag']
+        if previous.get('last_modified'):
+            headers['If-Modified-Since'] = previous['last_modified']
+
     try:
-        response = requests.get(url, timeout=20)
-        response.raise_for_status()
-        return response.text
+        with get_http_session().get(url, timeout=20, stream=True, headers=headers) as response:
+            if response.status_code == 304:
+                return DOWNLOAD_NOT_MODIFIED, None
+            response.raise_for_status()
+            with open(dest_path, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=1024 * 1024):
+                    f.write(chunk)
+            validators = {
+                key: value for key, value in (
+                    ('etag', response.headers.get('ETag')),
+                    ('last_modified', response.headers.get('Last-Modified')),
+                ) if value
+            }
+        return DOWNLOAD_OK, validators
     except Exception as e:
         print(f"[ERROR] Failed to download {url}: {e}")
-        return None
+        return DOWNLOAD_FAILED, None
+
+def open_xml_file(path):
+    """Open an EPG file for binary reading, transparently decompressing gzip and xz files."""
+    with open(path, 'rb') as f:
+        magic = f.read(len(XZ_MAGIC))
+    if magic.startswith(GZIP_MAGIC):
+        return gzip.open(path, 'rb')
+    if magic.startswith(XZ_MAGIC):
+        return lzma.open(path, 'rb')
+    return open(path, 'rb')
 
 def read_local_xml(path):
     try:
-        with open(path, 'r', encoding='utf-8') as f:
-            return f.read()
+        with open_xml_file(path) as f:
+            return f.read().decode('utf-8')
     except Exception as e:
         print(f"[ERROR] Failed to read local file {path}: {e}")
         return None
 
-from deep_translator import GoogleTranslator, ChatGptTranslator
-
 def translate_text(text):
     if not text.strip():
         return text
 
     try:
-        lang = detect(text)
-        if lang in SKIP_LANGUAGES:
+        if detect_language(text) in SKIP_LANGUAGES:
             return text
 
-        # First attempt: Google Translate
+        # First attempt: primary backend (Google Translate by default)
+        primary = get_backend(PRIMARY_BACKEND)
         try:
-            google_translated = GoogleTranslator(source='auto', target=TARGET_LANGUAGE).translate(text)
+            google_translated = primary.translate_batch([text], TARGET_LANGUAGE)[0]
         except Exception as ge:
-            print(f"❌ Google translation error: \"{text}\" — {ge}")
+            print(f"❌ {primary.label} translation error: \"{text}\" — {ge}")
             google_translated = text  # fallback logic will handle
 
         if google_translated and google_translated != text:
@@ -110,17 +1007,18 @@ def translate_text(text):
         #else:
         #    print(f"⚠️ Google translation unchanged: \"{text}\"")
 
-        # Fallback: ChatGPT
-        if ENABLE_CHATGPT_FALLBACK:
+        # Fallback: ChatGPT by default
+        if ENABLE_CHATGPT_FALLBACK and fallback_backend_enabled():
+            fallback = get_backend(FALLBACK_BACKEND)
             try:
-                chatgpt_translated = ChatGptTranslator(api_key=OPENAI_KEY, target=TARGET_LANGUAGE).translate(text)
+                chatgpt_translated = fallback.translate_batch([text], TARGET_LANGUAGE)[0]
                 if chatgpt_translated == text:
-                    print(f"⚠️ ChatGPT translation unchanged: \"{text}\"")
+                    print(f"⚠️ {fallback.label} translation unchanged: \"{text}\"")
                 #else:
                 #    print(f"⚠️ ChatGPT translation used: \"{chatgpt_translated}\"")
                 return chatgpt_translated
             except Exception as ce:
-                print(f"❌ ChatGPT translation error: \"{text}\" — {ce}")
+                print(f"❌ {fallback.label} translation error: \"{text}\" — {ce}")
 
         return text  # fallback: original if both fail
 
@@ -132,12 +1030,7 @@ def translate_text(text):
 
 
 def translate_element_text(elem, parent_tag):
-    translatable_tags = {
-        'channel': {'display-name'},
-        'programme': {'title', 'desc', 'category', 'country'}
-    }
-
-    if elem.tag in translatable_tags.get(parent_tag, set()) and elem.text:
+    if elem.tag in TRANSLATABLE_TAGS.get(parent_tag, set()) and elem.text:
         original = elem.text
         translated = translate_text(original)
         if translated and translated != original:
@@ -148,12 +1041,21 @@ def translate_element_text(elem, parent_tag):
 
 
 
+COMPRESSED_SUFFIXES = ('.gz', '.xz')
+
+def strip_compressed_suffix(filename):
+    """Output files are written uncompressed: 'epg.xml.gz' is saved as 'epg.xml'."""
+    for suffix in COMPRESSED_SUFFIXES:
+        if filename.lower().endswith(suffix):
+            return filename[:-len(suffix)]
+    return filename
+
 def get_filename_from_url(url):
     parsed = urlparse(url)
-    return os.path.basename(parsed.path) or f"epg_unknown.xml"
+    return strip_compressed_suffix(os.path.basename(parsed.path)) or f"epg_unknown.xml"
 
 def get_filename_from_path(path):
-    return os.path.basename(path) or "local_epg.xml"
+    return strip_compressed_suffix(os.path.basename(path)) or "local_epg.xml"
 
 def load_channel_filters(filepath, header_key):
     """
@@ -230,229 +1132,1670 @@ def should_use_chatgpt_fallback(source_key, fallback_settings):
     return ENABLE_CHATGPT_FALLBACK
 
 
-def translate_xml_content(xml_string, allowed_channel_ids=None, log_source_name="", fallback_settings=None):
+def normalize_text(text):
+    """Key used to group identical texts: the stripped text, exactly as it is sent for translation."""
+    return text.strip() if text else ""
+
+
+class WorkQueue:
+    """
+    Translation work of one source (or streaming window) in compact form.
+
+    Each unique normalized text gets one slot: texts[slot] holds the interned text and
+    results[slot] its translated form, filled in place by the batch pipeline (None keeps the
+    original). text_ids is an array giving the slot of each queued occurrence, and targets the
+    element that occurrence is written back to (None for plain texts), so memory used by the
+    translation itself grows with the number of unique texts rather than with the number of elements.
+    done[slot] is set once a slot's result is final, at which point it is also written to the
+    source's checkpoint, if any.
+    """
+
+    def __init__(self, use_fallback, checkpoint=None):
+        self.use_fallback = use_fallback
+        self.checkpoint = checkpoint
+        self.texts = []
+        self.results = []
+        self.done = bytearray()
+        self.slot_of = {}
+        self.pending = []  # slots still to translate, in first-seen order
+        self.text_ids = array('I')
+        self.targets = []
+        self.shared_slots = set()  # slots filled from the cross-source pass
+        self.shared = 0  # occurrences filled from the cross-source pass
+        self.resumed = 0  # unique texts filled from the checkpoint
+        self.resumed_occurrences = 0
+
+    def add(self, text, target=None):
+        """Queue one occurrence of text; empty texts are ignored."""
+        key = normalize_text(text)
+        if not key:
+            return
+        slot = self.slot_of.get(key)
+        if slot is None:
+            slot = len(self.texts)
+            self.slot_of[key] = slot
+            self.texts.append(sys.intern(key))
+            translated = _shared_translations.get((key, self.use_fallback))
+            if translated is not None:
+                self.results.append(translated if translated != key else None)
+                self.done.append(1)
+                self.shared_slots.add(slot)
+            elif self.checkpoint is not None and key in self.checkpoint.results:
+                self.results.append(self.checkpoint.results[key])
+                self.done.append(1)
+                self.resumed += 1
+            else:
+                self.results.append(None)
+                self.done.append(0)
+                self.pending.append(slot)
+        if self.done[slot]:
+            # Filled when the slot was created, before any translation
+            if slot in self.shared_slots:
+                self.shared += 1
+            else:
+                self.resumed_occurrences += 1
+        self.text_ids.append(slot)
+        self.targets.append(target)
+
+    def finish(self, slots):
+        """Mark the results of slots as final and record them in the checkpoint."""
+        if not slots:
+            return
+        for slot in slots:
+            self.done[slot] = 1
+        if self.checkpoint is not None:
+            self.checkpoint.record([(self.texts[slot], self.results[slot]) for slot in slots])
+
+    def apply(self):
+        """Write the translated texts back to the queued elements."""
+        for elem, slot in zip(self.targets, self.text_ids):
+            new_text = self.results[slot]
+            if elem is not None and new_text and new_text.strip() != (elem.text or "").strip():
+                elem.text = new_text
+
+
+def translate_queue(queue, log_source_name="", stats=None):
+    """Translate the pending slots of a WorkQueue in place."""
+    if queue.shared:
+        bump_stat(stats, 'shared_texts', queue.shared)
+        print(f"🔗 {queue.shared} texts in {log_source_name} reuse translations shared with other sources")
+
+    if queue.resumed:
+        bump_stat(stats, 'resumed_texts', queue.resumed)
+        bump_stat(stats, 'resumed_occurrences', queue.resumed_occurrences)
+        print(f"⏯️ {queue.resumed} texts in {log_source_name} were already translated by an interrupted run")
+
+    total = len(queue.pending)
+    remaining = len(queue.text_ids) - queue.shared - queue.resumed_occurrences
+    factor = remaining / total if total else 1.0
+    bump_stat(stats, 'elements', len(queue.text_ids))
+    bump_stat(stats, 'unique_texts', total)
+    print(f"🔁 {remaining} elements share {total} unique texts in {log_source_name} (repetition factor {factor:.2f}x)")
+    if not total:
+        return
     try:
-        root = ET.fromstring(xml_string)
-        now = datetime.utcnow()
-        three_days_later = now + timedelta(days=2)
-        use_fallback = should_use_chatgpt_fallback(log_source_name, fallback_settings or {})
-        print(f"🤖 ChatGPT fallback for {log_source_name}: {'ENABLED' if use_fallback else 'DISABLED'}")
+        batch_translate_with_fallback(queue, queue.pending, queue.use_fallback, stats)
+    except Exception as e:
+        # Keep whatever was translated before the failure rather than losing the whole source
+        print(f"[ERROR] ❌ Translation of {log_source_name} stopped early: {e}")
 
+    untranslated = sum(1 for slot in queue.pending if not queue.done[slot])
+    if untranslated:
+        bump_stat(stats, 'untranslated', untranslated)
+        print(f"⚠️ {untranslated} of {total} texts in {log_source_name} could not be translated and keep their original text")
 
-        found_channel_ids = set(elem.attrib.get('id') for elem in root.findall('channel'))
-        found_programme_channels = set(elem.attrib.get('channel') for elem in root.findall('programme'))
-        all_present_ids = found_channel_ids.union(found_programme_channels)
 
-        if allowed_channel_ids is not None:
-            matched = allowed_channel_ids.intersection(all_present_ids)
-            missing = allowed_channel_ids.difference(all_present_ids)
+def translate_elements(queue, log_source_name="", stats=None):
+    """
+    Translate the elements queued on a WorkQueue in place.
 
-            if not matched:
-                print(f"⚠️ WARNING: None of the specified channels were found in: {log_source_name}")
-            else:
-                print(f"📋 Found channels to translate in {log_source_name}: {sorted(matched)}")
+    Elements are grouped by normalized text as they are queued, so that each unique string is
+    translated once, then the result is written back to every element carrying that text.
+    Texts already translated by the cross-source pass (see share_common_translations) or found in
+    the source's checkpoint are filled in directly.
+    """
+    if stats is None:
+        stats = {}
+    translate_queue(queue, log_source_name, stats)
+    queue.apply()
+    return stats
 
-            if missing:
-                print(f"❌ Channels not found in {log_source_name}: {sorted(missing)}")
 
-        # Filter <programme> based on channel and date
-        for programme in list(root.findall('programme')):
-            channel_ok = (
-                allowed_channel_ids is None or
-                programme.attrib.get('channel') in allowed_channel_ids
-            )
+def translate_texts(texts, use_fallback, log_source_name="", stats=None, checkpoint=None):
+    """
+    Translate plain strings through the same pipeline as element texts. Returns {text: translated text}
+    for the texts whose result is final; texts that could not be translated are left out.
+    """
+    queue = WorkQueue(use_fallback, checkpoint)
+    for text in texts:
+        queue.add(text)
+    translate_queue(queue, log_source_name, stats)
+    return {text: queue.results[slot] or text for text, slot in queue.slot_of.items() if queue.done[slot]}
 
-            start_str = programme.attrib.get('start', '')[:14]
-            try:
-                start_time = datetime.strptime(start_str, "%Y%m%d%H%M%S")
-            except ValueError:
-                start_time = None
-                
-            stop_str = programme.attrib.get('stop', '')[:14]
+
+def report_cache_stats(stats, log_source_name):
+    """Print the per-source translation cache counters."""
+    if get_translation_cache() is not None:
+        print(f"💾 Translation cache for {log_source_name}: "
+              f"{PRIMARY_BACKEND} {stats.get('primary_cache_hits', 0)} hits / {stats.get('primary_cache_misses', 0)} misses, "
+              f"{FALLBACK_BACKEND or 'fallback'} {stats.get('fallback_cache_hits', 0)} hits / {stats.get('fallback_cache_misses', 0)} misses")
+
+
+def report_reused_translations(stats, log_source_name):
+    """Print how many fields were copied from the previous output in incremental mode."""
+    if INCREMENTAL_MODE:
+        print(f"♻️ {log_source_name}: reused {stats.get('reused_previous', 0)} translations from the previous output")
+
+
+def report_channel_matches(allowed_channel_ids, present_ids, log_source_name):
+    """Log which of the requested channels were (not) found in a source."""
+    if allowed_channel_ids is None:
+        return
+
+    matched = allowed_channel_ids.intersection(present_ids)
+    missing = allowed_channel_ids.difference(present_ids)
+
+    if not matched:
+        print(f"⚠️ WARNING: None of the specified channels were found in: {log_source_name}")
+    else:
+        print(f"📋 Found channels to translate in {log_source_name}: {sorted(matched)}")
+
+    if missing:
+        print(f"❌ Channels not found in {log_source_name}: {sorted(missing)}")
+
+
+@lru_cache(maxsize=65536)
+def parse_xmltv_time(value):
+    """
+    Parse an XMLTV timestamp ("YYYYMMDDhhmmss +hhmm") into a naive UTC datetime.
+
+    Fixed-width slicing is much cheaper than strptime, and the cache makes the many
+    programmes sharing a start/stop time free. The timezone offset, when present, is
+    applied so that feeds published in local time are compared correctly with now.
+    Returns None for malformed values.
+    """
+    try:
+        parsed = datetime(int(value[0:4]), int(value[4:6]), int(value[6:8]),
+                          int(value[8:10]), int(value[10:12]), int(value[12:14]))
+    except (ValueError, TypeError):
+        return None
+
+    offset = value[14:].strip()
+    if len(offset) >= 5 and offset[0] in '+-' and offset[1:5].isdigit():
+        delta = timedelta(hours=int(offset[1:3]), minutes=int(offset[3:5]))
+        parsed = parsed - delta if offset[0] == '+' else parsed + delta
+    return parsed
+
+
+# ================= TIME WINDOW AND FIELDS ================= #
+
+WINDOW_POLICY_KEYS = ('LOOKAHEAD_HOURS', 'PAST_GRACE_HOURS', 'CHANNEL_FIELDS', 'PROGRAMME_FIELDS')
+
+
+class WindowPolicy:
+    """
+    Which programmes of a source are kept and which fields are translated, relative to now.
+
+    Programmes are kept when they end after keep_after (now minus the past grace period) and no
+    later than window_end (now plus the look-ahead). fields maps 'channel' and 'programme' to
+    {field: horizon}: a programme field is only translated for programmes starting by its horizon,
+    so that e.g. titles can be translated a week ahead and descriptions only for the next day.
+    """
+
+    def __init__(self, now=None, lookahead_hours=None, past_grace_hours=None, channel_fields=None, programme_fields=None):
+        self.now = now or datetime.utcnow()
+        self.lookahead_hours = LOOKAHEAD_HOURS if lookahead_hours is None else lookahead_hours
+        self.past_grace_hours = PAST_GRACE_HOURS if past_grace_hours is None else past_grace_hours
+        self.keep_after = self.now - timedelta(hours=self.past_grace_hours)
+        self.window_end = self.now + timedelta(hours=self.lookahead_hours)
+        programme_fields = PROGRAMME_FIELDS if programme_fields is None else programme_fields
+        self.fields = {
+            'channel': dict.fromkeys(CHANNEL_FIELDS if channel_fields is None else channel_fields),
+            'programme': {
+                field: self.window_end if hours is None else min(self.window_end, self.now + timedelta(hours=hours))
+                for field, hours in programme_fields.items()
+            },
+        }
+
+    def describe(self):
+        fields = [f"{field}" if horizon == self.window_end else f"{field} {(horizon - self.now).total_seconds() / 3600:g}h"
+                  for field, horizon in self.fields['programme'].items()]
+        grace = f", {self.past_grace_hours:g}h past" if self.past_grace_hours else ""
+        return f"{self.lookahead_hours:g}h ahead{grace}, translating {', '.join(fields) or 'no programme fields'}"
+
+
+def load_window_policies(filepath):
+    """
+    Parses a policy file like:
+        [https://example.com/file.xml]
+        LOOKAHEAD_HOURS = 168
+        PROGRAMME_FIELDS = title:168, desc:24, category:24
+
+    i.e. the URL or path of a source in brackets, followed by the settings among WINDOW_POLICY_KEYS
+    that replace the global ones for that source.
+    """
+    policies = {}
+    if not filepath or not os.path.exists(filepath):
+        return policies
+
+    current = None
+    with open(filepath, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if line.startswith('[') and line.endswith(']'):
+                current = policies.setdefault(line[1:-1].strip().lower(), {})
+                continue
+
+            key, _, value = line.partition('=')
+            key, value = key.strip().upper(), value.strip().strip('\'"')
+            if current is None or key not in WINDOW_POLICY_KEYS:
+                print(f"⚠️ Ignoring line in {filepath}: {line}")
+                continue
             try:
-                stop_time = datetime.strptime(stop_str, "%Y%m%d%H%M%S")
+                current[key] = parse_field_list(value) if key.endswith('_FIELDS') else float(value)
             except ValueError:
-                stop_time = None
-
-            # Remove if: wrong channel OR invalid date OR in the past OR beyond 3 days
-            if (not channel_ok or not stop_time or stop_time <= now or stop_time > three_days_later):
-                root.remove(programme)
-
-        # Filter <channel> by id if needed
-        if allowed_channel_ids is not None:
-            for channel in list(root.findall('channel')):
-                if channel.attrib.get('id') not in allowed_channel_ids:
-                    root.remove(channel)
-
-                # Collect only whitelisted elements to translate
-        elements = []
-        translatable_tags = {
-            'channel': {'display-name'},
-            'programme': {'title', 'desc', 'category', 'country'}
-        }
+                print(f"⚠️ Ignoring invalid value in {filepath}: {line}")
+    return policies
 
-        for parent in root.iter():
-            parent_tag = parent.tag
-            for child in list(parent):
-                if child.tag not in translatable_tags.get(parent_tag, set()):
-                    continue  # Skip non-whitelisted fields
 
-                if parent_tag == "programme":
-                    start_str = parent.attrib.get('start', '')[:14]
-                    try:
-                        start_time = datetime.strptime(start_str, "%Y%m%d%H%M%S")
-                        if start_time > three_days_later:
-                            continue  # skip translation
-                    except ValueError:
-                        continue
+_window_policies = {}  # policy file -> (mtime, policies), reloaded when the file changes
+_window_policies_lock = threading.Lock()
 
-                elements.append((child, parent_tag))
 
+def get_window_policy(source, now=None):
+    """WindowPolicy of a source: the global settings, overridden by its section of WINDOW_POLICY_FILE."""
+    mtime = get_mtime(WINDOW_POLICY_FILE) if WINDOW_POLICY_FILE else None
+    with _window_policies_lock:
+        cached = _window_policies.get(WINDOW_POLICY_FILE)
+        if cached is None or cached[0] != mtime:
+            cached = _window_policies[WINDOW_POLICY_FILE] = (mtime, load_window_policies(WINDOW_POLICY_FILE))
+    overrides = cached[1].get(source.strip().lower(), {})
+    return WindowPolicy(now, overrides.get('LOOKAHEAD_HOURS'), overrides.get('PAST_GRACE_HOURS'),
+                        overrides.get('CHANNEL_FIELDS'), overrides.get('PROGRAMME_FIELDS'))
 
-        total = len(elements)
-        print(f"🌍 Translating only whitelisted fields with {NUM_WORKERS} workers...")
 
-        translated_pairs = batch_translate_with_fallback(elements, use_fallback)
+def keep_programme(attrib, allowed_channel_ids, policy):
+    """True if the programme belongs to an allowed channel and ends inside the policy's time window."""
+    if allowed_channel_ids is not None and attrib.get('channel') not in allowed_channel_ids:
+        return False
+
+    # Drop if: invalid date OR in the past OR beyond the window
+    stop_time = parse_xmltv_time(attrib.get('stop', ''))
+    return stop_time is not None and policy.keep_after < stop_time <= policy.window_end
+
+
+def previous_translation_key(parent, field):
+    """Index key of a translated field: (channel, start, field) for programmes, (channel id, '', field) for channels."""
+    if parent.tag == 'programme':
+        return (parent.attrib.get('channel'), parent.attrib.get('start', ''), field)
+    return (parent.attrib.get('id'), '', field)
+
+
+def load_previous_translations(out_path, fields=None):
+    """
+    Index the output of a previous run by (channel, start, field), for the fields of
+    fields (a WindowPolicy.fields mapping, TRANSLATABLE_TAGS by default).
+
+    Each key maps to the "translated / original" texts found for it, so that fields whose
+    original text has not changed can be copied across instead of being translated again.
+    Returns an empty index if there is no usable previous output.
+    """
+    index = defaultdict(list)
+    if not os.path.exists(out_path):
+        return index
+    fields_by_tag = fields or TRANSLATABLE_TAGS
+
+    try:
+        root = None
+        for event, elem in ET.iterparse(out_path, events=('start', 'end')):
+            if root is None:
+                root = elem
+                continue
+            if event != 'end' or elem.tag not in fields_by_tag:
+                continue
+            fields = fields_by_tag[elem.tag]
+            for child in elem:
+                if child.tag in fields and child.text:
+                    index[previous_translation_key(elem, child.tag)].append(child.text)
+            root.clear()
+    except Exception as e:
+        print(f"[WARN] Could not index previous output {out_path}, translating from scratch: {e}")
+        return defaultdict(list)
+
+    return index
+
+
+def reuse_previous_translation(parent, child, previous):
+    """Copy the previous run's translation into child if its original text is unchanged. Returns True if reused."""
+    original = normalize_text(child.text)
+    if not original:
+        return False
+
+    suffix = f" / {original}"
+    for candidate in previous.get(previous_translation_key(parent, child.tag), ()):
+        # Only reuse real translations; untranslated "text / text" entries get another chance
+        if candidate.endswith(suffix) and candidate[:-len(suffix)].strip() != original:
+            child.text = candidate
+            return True
+    return False
+
+
+def collect_translatable(parent, policy, previous=None, stats=None, classifier=None):
+    """
+    Yield the children of a <channel> or <programme> element to translate under the policy.
+    Fields that can be copied from the previous output (see INCREMENTAL_MODE) are filled in and skipped,
+    and so are fields the classifier finds already written in one of SKIP_LANGUAGES.
+    """
+    fields = policy.fields.get(parent.tag)
+    if not fields:
+        return
+
+    start_time = None
+    if parent.tag == "programme":
+        start_time = parse_xmltv_time(parent.attrib.get('start', ''))
+        if start_time is None or start_time > policy.window_end:
+            return  # skip translation
+
+    channel_id = parent.attrib.get('channel' if parent.tag == 'programme' else 'id')
+    for child in parent:
+        if child.tag not in fields:
+            continue
+        horizon = fields[child.tag]
+        if horizon is not None and start_time > horizon:
+            bump_stat(stats, 'beyond_field_horizon')
+            continue
+        if previous and reuse_previous_translation(parent, child, previous):
+            bump_stat(stats, 'reused_previous')
+            continue
+        text = normalize_text(child.text)
+        if classifier is not None and text and classifier.is_skippable(channel_id, child.tag, text):
+            bump_stat(stats, 'skipped_language')
+            continue
+        yield child
 
-        for i, (elem, new_text) in enumerate(translated_pairs, 1):
-            if new_text and new_text.strip() != (elem.text or "").strip():
-                elem.text = new_text
-            if i % max(1, total // 100) == 0 or i == total:
-                pct = round((i / total) * 100, 1)
-                print(f"    - {pct}% complete ({i}/{total})")
 
+def keep_top_level(tag, attrib, allowed_channel_ids, policy):
+    """Channel/date filter of one top-level element (<channel>, <programme> or anything else), from its start tag."""
+    if tag == 'programme':
+        return keep_programme(attrib, allowed_channel_ids, policy)
+    if tag == 'channel':
+        return allowed_channel_ids is None or attrib.get('id') in allowed_channel_ids
+    return True
 
-        return ET.tostring(root, encoding='utf-8').decode('utf-8')
+
+class PruningTreeBuilder:
+    """
+    Parser target building an XMLTV tree without the top-level elements the filters drop.
+
+    Each <channel> and <programme> is accepted or rejected from its start tag (see keep_top_level);
+    the events of rejected ones, their trailing whitespace included, never reach the underlying
+    TreeBuilder, so programmes outside the channel filter or time window are never allocated.
+    Counts kept and dropped elements and collects the channel ids present in the feed. With
+    stream=True, each completed top-level element is also appended to ready.
+    """
+
+    def __init__(self, allowed_channel_ids, policy, stream=False):
+        self.allowed_channel_ids = allowed_channel_ids
+        self.policy = policy
+        self.root = None
+        self.present_ids = set()
+        self.kept = 0
+        self.dropped = 0
+        self.ready = [] if stream else None
+        self._builder = ET.TreeBuilder()
+        self._data = self._builder.data
+        self._depth = 0
+        self._skipping = False
+        self._skip_tail = False
+
+    def start(self, tag, attrib):
+        self._depth += 1
+        if self._skipping:
+            return None
+        if self._depth == 2:
+            self._skip_tail = False
+            self.present_ids.add(attrib.get('channel' if tag == 'programme' else 'id'))
+            if not keep_top_level(tag, attrib, self.allowed_channel_ids, self.policy):
+                self.dropped += 1
+                self._skipping = True
+                return None
+            self.kept += 1
+        elem = self._builder.start(tag, attrib)
+        if self.root is None:
+            self.root = elem
+        return elem
+
+    def end(self, tag):
+        depth = self._depth
+        self._depth -= 1
+        if self._skipping:
+            if depth == 2:
+                self._skipping = False
+                self._skip_tail = True
+            return None
+        elem = self._builder.end(tag)
+        if depth == 2 and self.ready is not None:
+            self.ready.append(elem)
+        return elem
+
+    def data(self, data):
+        if not self._skipping and not self._skip_tail:
+            self._data(data)
+
+    def close(self):
+        return self._builder.close()
+
+
+def parse_pruned(data, allowed_channel_ids, policy):
+    """Parse an XMLTV document, dropping filtered-out elements as they are read. Returns (root, builder)."""
+    builder = PruningTreeBuilder(allowed_channel_ids, policy)
+    parser = ET.XMLParser(target=builder)
+    parser.feed(data)
+    return parser.close(), builder
+
+
+def collect_tree_elements(root, policy, queue, previous=None, stats=None):
+    """Add the fields to translate of a filtered tree to a WorkQueue, which is returned."""
+    classifier = LanguageClassifier(stats) if LANGUAGE_DETECTION else None
+    for parent in root:
+        for child in collect_translatable(parent, policy, previous, stats, classifier):
+            queue.add(child.text, child)
+    return queue
+
+
+def translate_xml_content(xml_string, allowed_channel_ids=None, log_source_name="", fallback_settings=None, previous=None, stats=None, policy=None):
+    """
+    Filter and translate an XMLTV document held in memory. Returns the translated document,
+    or None if it could not be processed (texts that could not be translated do not count as a failure).
+    """
+    stats = {} if stats is None else stats
+    policy = policy or get_window_policy(log_source_name)
+    try:
+        # Channel and time window filters are applied while parsing
+        with timed(stats, 'parse'):
+            root, builder = parse_pruned(xml_string, allowed_channel_ids, policy)
+        bump_stat(stats, 'kept', builder.kept)
+        bump_stat(stats, 'dropped', builder.dropped)
+        use_fallback = should_use_chatgpt_fallback(log_source_name, fallback_settings or {})
+        print(f"🤖 ChatGPT fallback for {log_source_name}: {'ENABLED' if use_fallback else 'DISABLED'}")
+        report_channel_matches(allowed_channel_ids, builder.present_ids, log_source_name)
+
+        # Queue only whitelisted elements to translate
+        with timed(stats, 'detect'):
+            queue = collect_tree_elements(root, policy, WorkQueue(use_fallback, get_checkpoint(log_source_name)), previous, stats)
+        report_reused_translations(stats, log_source_name)
+        report_language_skips(stats, log_source_name)
+
+        print(f"🌍 Translating only whitelisted fields with up to {GOOGLE_MAX_CONCURRENCY} workers...")
+        with timed(stats, 'translate'):
+            translate_elements(queue, log_source_name, stats)
+        del queue
+        report_cache_stats(stats, log_source_name)
+
+        with timed(stats, 'serialize'):
+            return ET.tostring(root, encoding='utf-8').decode('utf-8')
 
     except Exception as e:
         print(f"[ERROR] Failed to process XML: {e}")
-        return xml_string
+        return None
 
-def batch_translate_worker(batch, batch_index, total_batches, use_chatgpt_fallback):
-    results = [None] * len(batch)
-    fallback_queue = []
-    texts = [elem.text.strip() if elem.text else "" for elem, _ in batch]
-    print(f"📦 Starting Google batch {batch_index}/{total_batches} with {len(batch)} items")
+
+STREAM_READ_SIZE = 1 << 20
+
+
+def translate_xml_stream(source, out_path, allowed_channel_ids=None, log_source_name="", fallback_settings=None, previous=None, stats=None, policy=None):
+    """
+    Streaming counterpart of translate_xml_content for large feeds.
+
+    <channel> and <programme> elements are read one at a time and filtered from their start
+    tag (see PruningTreeBuilder). Their texts are translated in windows of STREAM_WINDOW_SIZE elements,
+    after which the finished elements are written to out_path and released, so memory use
+    stays roughly constant whatever the feed size. The output is written to a temporary
+    file first and only moved to out_path once the whole feed has been processed.
+    Returns True on success.
+    """
+    policy = policy or get_window_policy(log_source_name)
+    use_fallback = should_use_chatgpt_fallback(log_source_name, fallback_settings or {})
+    print(f"🤖 ChatGPT fallback for {log_source_name}: {'ENABLED' if use_fallback else 'DISABLED'}")
+    print(f"🌊 Streaming {log_source_name} in windows of {STREAM_WINDOW_SIZE} elements with up to {GOOGLE_MAX_CONCURRENCY} workers...")
+
+    stats = {} if stats is None else stats
+    checkpoint = get_checkpoint(log_source_name)
+    classifier = LanguageClassifier(stats) if LANGUAGE_DETECTION else None
+    builder = PruningTreeBuilder(allowed_channel_ids, policy, stream=True)
+    pending = []  # filtered top-level elements waiting for their window to be translated
+    queue = WorkQueue(use_fallback, checkpoint)  # fields of the pending elements
+    tmp_path = f"{out_path}.part"
+
+    def flush_window(out):
+        nonlocal queue
+        if queue.text_ids:
+            with timed(stats, 'translate'):
+                translate_elements(queue, log_source_name, stats)
+            queue = WorkQueue(use_fallback, checkpoint)
+        for elem in pending:
+            out.write(ET.tostring(elem, encoding='utf-8', xml_declaration=False))
+        pending.clear()
 
     try:
-        translated_texts = GoogleTranslator(source='auto', target='en').translate_batch(texts)
-        print(f"✅ Google batch {batch_index} succeeded.")
+        with open(tmp_path, 'wb') as out, open_xml_file(source) as xml_file:
+            parser = ET.XMLParser(target=builder)
+            root_written = False
+            while True:
+                chunk = xml_file.read(STREAM_READ_SIZE)
+                if chunk:
+                    parser.feed(chunk)
+                else:
+                    parser.close()
+                root = builder.root
+
+                if builder.ready or (not chunk and root is not None):
+                    # The root's own text is only known once its first kept child has started
+                    if not root_written:
+                        attrs = ''.join(f" {k}={quoteattr(v)}" for k, v in root.attrib.items())
+                        out.write(f"<{root.tag}{attrs}>{escape(root.text or '')}".encode('utf-8'))
+                        root_written = True
+                    for elem in builder.ready:
+                        pending.append(elem)
+                        for child in collect_translatable(elem, policy, previous, stats, classifier):
+                            queue.add(child.text, child)
+                        if len(queue.text_ids) >= STREAM_WINDOW_SIZE:
+                            flush_window(out)
+                    builder.ready.clear()
+                    root.clear()
+                if not chunk:
+                    break
+
+            if root is None:
+                raise ValueError("empty document")
+            flush_window(out)
+            out.write(f"</{root.tag}>".encode('utf-8'))
+
+        os.replace(tmp_path, out_path)
     except Exception as e:
-        print(f"[ERROR] ❌ Google batch {batch_index} failed: {e}")
-        translated_texts = [None] * len(texts)
+        print(f"[ERROR] Failed to process XML stream: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+
+    kept, dropped = builder.kept, builder.dropped
+    bump_stat(stats, 'kept', kept)
+    bump_stat(stats, 'dropped', dropped)
+    report_channel_matches(allowed_channel_ids, builder.present_ids, log_source_name)
+    elements = stats.get('elements', 0) - stats.get('shared_texts', 0) - stats.get('resumed_occurrences', 0)
+    print(f"🧮 {log_source_name}: kept {kept} elements, dropped {dropped} by channel/date filters; "
+          f"{elements} texts, {stats.get('unique_texts', 0)} unique "
+          f"(repetition factor {elements / max(1, stats.get('unique_texts', 0)):.2f}x)")
+    report_reused_translations(stats, log_source_name)
+    report_language_skips(stats, log_source_name)
+    report_cache_stats(stats, log_source_name)
+    return True
+
+# ================= SHARDING ================= #
+
+TOP_LEVEL_RE = re.compile(rb'<(?:channel|programme)[\s/>]')
+PROGRAMME_CHANNEL_RE = re.compile(rb'<programme\b[^>]*?\bchannel\s*=\s*["\']([^"\']*)["\']')
+CHANNEL_ID_RE = re.compile(rb'<channel\b[^>]*?\bid\s*=\s*["\']([^"\']*)["\']')
+XML_DECLARATION_RE = re.compile(rb'(?:\xef\xbb\xbf)?\s*<\?xml[^>]*\?>')
+PLACEHOLDER_RE = re.compile(rb'\x00(\d+)\x00')
+SHARDS_PER_PROCESS = 4
+
+# Settings shard workers need; passed explicitly since spawned workers do not share module state
+SHARD_WORKER_SETTINGS = ('SKIP_LANGUAGES', 'LANGUAGE_DETECTION', 'LANGUAGE_PRIOR_SAMPLE',
+                         'LANGUAGE_DETECTION_MIN_CHARS', 'LANGUAGE_DETECTION_MIN_CONFIDENCE')
+
+_shard_pool = None
+_shard_pool_lock = threading.Lock()
+
+
+def init_shard_worker(settings):
+    globals().update(settings)
+
+
+def get_shard_pool():
+    """Process pool of SHARD_PROCESSES workers, created on first use."""
+    global _shard_pool
+    with _shard_pool_lock:
+        if _shard_pool is None:
+            settings = {name: globals()[name] for name in SHARD_WORKER_SETTINGS}
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            # spawn rather than fork: the parent runs download and translation threads
+            _shard_pool = ProcessPoolExecutor(max_workers=SHARD_PROCESSES, mp_context=multiprocessing.get_context('spawn'),
+                                              initializer=init_shard_worker, initargs=(settings,))
+        return _shard_pool
+
+
+def shutdown_shard_pool():
+    global _shard_pool
+    with _shard_pool_lock:
+        if _shard_pool is not None:
+            _shard_pool.shutdown()
+            _shard_pool = None
+
+
+def next_channel_boundary(data, pos, end):
+    """Offset of the first <programme> after pos whose channel differs from the programme before it, or None."""
+    first_channel = None
+    for match in PROGRAMME_CHANNEL_RE.finditer(data, pos, end):
+        if first_channel is None:
+            first_channel = match.group(1)
+        elif match.group(1) != first_channel:
+            return match.start()
+    return None
+
+
+def find_shard_bounds(data, body_start, body_end, n_shards):
+    """
+    Split data[body_start:body_end] into at most n_shards byte ranges of roughly equal size.
 
-    for j, ((elem, parent_tag), original_text, translated) in enumerate(zip(batch, texts, translated_texts)):
-         # Skip empty original text
-        if not original_text.strip():
-            results[j] = (elem, original_text)  # keep as is
+    Ranges start at a <programme> whose channel differs from the previous one, so that all
+    consecutive programmes of a channel (and therefore its language prior) stay in one shard.
+    """
+    bounds = [body_start]
+    for i in range(1, n_shards):
+        target = body_start + (body_end - body_start) * i // n_shards
+        if target <= bounds[-1]:
             continue
-            
-        if not translated:
-            print(f"[WARN] Google returned None for text: \"{original_text}\"")
+        boundary = next_channel_boundary(data, target, body_end)
+        if boundary is None:
+            break
+        bounds.append(boundary)
+    bounds.append(body_end)
+    return list(zip(bounds, bounds[1:]))
 
-        if not translated or translated.strip() == original_text.strip():
-            fallback_queue.append((j, original_text, (elem, parent_tag)))
+
+def group_previous_by_channel(previous):
+    """Split a load_previous_translations index into {(tag, channel): {key: translations}}."""
+    grouped = defaultdict(dict)
+    for key, translations in previous.items():
+        grouped[('programme' if key[1] else 'channel', key[0])][key] = translations
+    return grouped
+
+
+def shard_previous_translations(grouped, data, start, end):
+    """
+    The part of a grouped previous-run index a shard needs: the entries of the channels
+    and of the programmes' channels found in data[start:end]. Sending each worker only
+    these keeps the cost of pickling the index independent of the number of shards.
+    """
+    entities = {'&quot;': '"', '&apos;': "'"}
+    wanted = {(tag, unescape(match.group(1).decode('utf-8', 'replace'), entities))
+              for tag, regex in (('channel', CHANNEL_ID_RE), ('programme', PROGRAMME_CHANNEL_RE))
+              for match in regex.finditer(data, start, end)}
+    index = {}
+    for group in wanted & grouped.keys():
+        index.update(grouped[group])
+    return index
+
+
+def process_shard(path, start, end, declaration, allowed_channel_ids, policy, previous):
+    """
+    Parse, filter, classify and serialize one byte range of an XMLTV file (runs in a worker process).
+
+    Texts to translate are replaced by NUL-delimited index placeholders in the serialized output and
+    returned separately, in placeholder order, for the parent to translate and substitute.
+    Returns (body, originals, present_ids, kept, dropped, stats).
+    """
+    with open(path, 'rb') as f:
+        f.seek(start)
+        chunk = f.read(end - start)
+    shard, builder = parse_pruned(declaration + b'<shard>' + chunk + b'</shard>', allowed_channel_ids, policy)
+    del chunk
+
+    stats = {}
+    classifier = LanguageClassifier(stats) if LANGUAGE_DETECTION else None
+    originals = []
+    for elem in shard:
+        for child in collect_translatable(elem, policy, previous, stats, classifier):
+            originals.append(child.text)
+            child.text = f"\x00{len(originals) - 1}\x00"
+
+    # Serialize the kept elements in one call and drop the <shard> wrapper again
+    body = ET.tostring(shard, encoding='utf-8', xml_declaration=False)[len(b'<shard>'):-len(b'</shard>')] if len(shard) else b''
+    return body, originals, builder.present_ids, builder.kept, builder.dropped, stats
+
+
+def translate_xml_sharded(source, out_path, allowed_channel_ids=None, log_source_name="", fallback_settings=None, previous=None, stats=None, policy=None):
+    """
+    Multi-process counterpart of translate_xml_content for large feeds on multi-core machines.
+
+    The feed is cut into SHARD_PROCESSES * SHARDS_PER_PROCESS byte ranges aligned on channel
+    changes. Worker processes parse, filter, run language detection on and serialize their
+    ranges; this process translates the texts they return (deduplicated across shards, with
+    the usual batching, caching and fallback) and writes the shards back in their original
+    order, so channel and programme order is preserved. Returns True on success.
+    """
+    policy = policy or get_window_policy(log_source_name)
+    use_fallback = should_use_chatgpt_fallback(log_source_name, fallback_settings or {})
+    print(f"🤖 ChatGPT fallback for {log_source_name}: {'ENABLED' if use_fallback else 'DISABLED'}")
+
+    stats = {} if stats is None else stats
+    checkpoint = get_checkpoint(log_source_name)
+    present_ids = set()
+    memo = {}  # normalized text -> translated text, shared by all shards of the feed
+    kept = dropped = 0
+    tmp_path = f"{out_path}.part"
+    plain_path = None
+
+    try:
+        with open_xml_file(source) as xml_file:
+            if isinstance(xml_file, (gzip.GzipFile, lzma.LZMAFile)):
+                # Byte ranges need an uncompressed file
+                fd, plain_path = tempfile.mkstemp(suffix='.xml')
+                with os.fdopen(fd, 'wb') as plain:
+                    shutil.copyfileobj(xml_file, plain)
+        xml_path = plain_path or source
+
+        with open(xml_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            first = TOP_LEVEL_RE.search(data)
+            if first is None:
+                raise ValueError("no <channel> or <programme> elements found")
+            header = data[:first.start()]
+            declaration = XML_DECLARATION_RE.match(header)
+            declaration = declaration.group(0) if declaration else b''
+
+            # Root tag, attributes and text as the tree and streaming modes write them
+            header_parser = ET.XMLPullParser(['start'])
+            header_parser.feed(header + b'<shard/>')
+            root = next(elem for _, elem in header_parser.read_events())
+            attrs = ''.join(f" {k}={quoteattr(v)}" for k, v in root.attrib.items())
+            body_end = data.rfind(f"</{root.tag}".encode('utf-8'))
+            if body_end < first.start():
+                raise ValueError(f"closing </{root.tag}> not found")
+            bounds = find_shard_bounds(data, first.start(), body_end, SHARD_PROCESSES * SHARDS_PER_PROCESS)
+            if previous:
+                grouped = group_previous_by_channel(previous)
+                shard_indexes = [shard_previous_translations(grouped, data, start, end) for start, end in bounds]
+                del grouped
+            else:
+                shard_indexes = [previous] * len(bounds)
+
+        print(f"🧩 Processing {log_source_name} in {len(bounds)} shards on {SHARD_PROCESSES} processes...")
+        pool = get_shard_pool()
+        futures = [pool.submit(process_shard, xml_path, start, end, declaration, allowed_channel_ids,
+                               policy, shard_index) for (start, end), shard_index in zip(bounds, shard_indexes)]
+        del shard_indexes
+
+        with open(tmp_path, 'wb') as out:
+            out.write((f"<{root.tag}{attrs}>" + escape(root.text or '')).encode('utf-8'))
+            for i, future in enumerate(futures, 1):
+                body, originals, shard_ids, shard_kept, shard_dropped, shard_stats = future.result()
+                present_ids |= shard_ids
+                kept += shard_kept
+                dropped += shard_dropped
+                for key, value in shard_stats.items():
+                    bump_stat(stats, key, value)
+
+                keys = [normalize_text(text) for text in originals]
+                new_texts = [key for key in keys if key and key not in memo]
+                bump_stat(stats, 'elements', sum(1 for key in keys if key) - len(new_texts))
+                if new_texts:
+                    with timed(stats, 'translate'):
+                        translated = translate_texts(new_texts, use_fallback, f"{log_source_name} shard {i}/{len(futures)}", stats, checkpoint)
+                    # Texts that could not be translated keep their original text and are not sent again by later shards
+                    memo.update((text, translated.get(text, text)) for text in new_texts)
+
+                def substitute(match):
+                    original = originals[int(match.group(1))]
+                    key = normalize_text(original)
+                    translated = memo.get(key)
+                    return escape(translated if translated and translated != key else original or '').encode('utf-8')
+
+                out.write(PLACEHOLDER_RE.sub(substitute, body))
+            out.write(f"</{root.tag}>".encode('utf-8'))
+
+        os.replace(tmp_path, out_path)
+    except Exception as e:
+        print(f"[ERROR] Failed to process XML in shards: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+    finally:
+        if plain_path:
+            os.remove(plain_path)
+
+    bump_stat(stats, 'kept', kept)
+    bump_stat(stats, 'dropped', dropped)
+    report_channel_matches(allowed_channel_ids, present_ids, log_source_name)
+    elements = stats.get('elements', 0) - stats.get('shared_texts', 0) - stats.get('resumed_occurrences', 0)
+    print(f"🧮 {log_source_name}: kept {kept} elements, dropped {dropped} by channel/date filters; "
+          f"{elements} texts, {len(memo)} unique (repetition factor {elements / max(1, len(memo)):.2f}x)")
+    report_reused_translations(stats, log_source_name)
+    report_language_skips(stats, log_source_name)
+    report_cache_stats(stats, log_source_name)
+    return True
+
+
+def batch_translate_worker(queue, batch, batch_index, total_batches, fallback_stage, stats=None):
+    """Translate one batch of WorkQueue slots with the primary backend, handing what it cannot translate to the fallback stage."""
+    fallback_slots = []
+    texts = [queue.texts[slot] for slot in batch]
+    primary = get_backend(PRIMARY_BACKEND)
+    print(f"📦 Starting {primary.label} batch {batch_index}/{total_batches} with {len(batch)} items ({sum(map(len, texts))} chars)")
+
+    translated_texts = translate_with_split(primary, texts, stats=stats)
+    failed = sum(1 for t in translated_texts if t is None)
+    if failed < len(texts):
+        print(f"✅ {primary.label} batch {batch_index} succeeded" + (f" ({failed} items failed)." if failed else "."))
+        cache = get_translation_cache()
+        if cache is not None:
+            cache.put_many(zip(texts, translated_texts), TARGET_LANGUAGE, primary.name)
+
+    finished = []
+    unchanged = []
+    for slot, original_text, translated in zip(batch, texts, translated_texts):
+        if not translated:
+            print(f"[WARN] {primary.label} returned None for text: \"{original_text}\"")
+            fallback_slots.append(slot)
+        elif translated.strip() == original_text:
+            unchanged.append(slot)
         else:
-            formatted = f"{translated} / {original_text}"
-            results[j] = (elem, formatted)
+            queue.results[slot] = f"{translated} / {original_text}"
+            finished.append(slot)
 
-    if fallback_queue:
-        print(f"💡 {len(fallback_queue)} items queued for ChatGPT fallback after Google batch {batch_index}")
-        flush_fallback_queue(fallback_queue, results, use_chatgpt_fallback)
+    if unchanged:
+        fallback_slots.extend(fallback_stage.route(unchanged))
+        if not fallback_stage.enabled:
+            finished.extend(unchanged)  # left as is for good
 
+    if fallback_slots:
+        print(f"💡 {len(fallback_slots)} items queued for fallback after {primary.label} batch {batch_index}")
+        bump_stat(stats, 'fallback_queued', len(fallback_slots))
+        fallback_stage.submit(fallback_slots)
+    queue.finish(finished)
 
     print(f"🏁 Finished batch {batch_index}/{total_batches}")
-    return results
 
 
+def translate_from_cache(queue, slots, fallback_stage, stats=None):
+    """
+    Resolve slots whose text is already in the translation cache, filling queue.results in place.
+    Returns the slots still to send to the primary backend.
+    """
+    cache = get_translation_cache()
+    if cache is None or not slots:
+        return slots
+
+    cached = cache.get_many([queue.texts[slot] for slot in slots], TARGET_LANGUAGE, PRIMARY_BACKEND)
+    misses = []
+    fallback_slots = []
+    finished = []
+
+    for slot in slots:
+        original_text = queue.texts[slot]
+        translated = cached.get(original_text)
+        if translated is None:
+            misses.append(slot)
+        elif translated.strip() == original_text:
+            # The primary backend already returned this text unchanged: go straight to fallback
+            fallback_slots.append(slot)
+        else:
+            queue.results[slot] = f"{translated} / {original_text}"
+            finished.append(slot)
+
+    hits = len(slots) - len(misses)
+    bump_stat(stats, 'primary_cache_hits', hits)
+    bump_stat(stats, 'primary_cache_misses', len(misses))
+    print(f"💾 Translation cache: {hits} hits, {len(misses)} misses")
+
+    fallback_slots = fallback_stage.route(fallback_slots)
+    if fallback_slots:
+        print(f"💡 {len(fallback_slots)} cached items queued for fallback")
+        fallback_stage.submit(fallback_slots)
+        if not fallback_stage.enabled:
+            finished.extend(fallback_slots)
+    queue.finish(finished)
+
+    return misses
 
 
-def batch_translate_with_fallback(elements: List[Tuple[ET.Element, str]], use_chatgpt_fallback: bool) -> List[Tuple[ET.Element, str]]:
-    results = []
-    total = len(elements)
-    batches = [elements[i:i + BATCH_SIZE] for i in range(0, total, BATCH_SIZE)]
+def batch_translate_with_fallback(queue: WorkQueue, slots: List[int], use_chatgpt_fallback: bool, stats=None) -> None:
+    """
+    Translate the given slots of a WorkQueue in parallel batches, filling queue.results in place.
+    Texts the primary backend cannot translate flow into a FallbackStage running alongside.
+    """
+    fallback_stage = FallbackStage(queue, use_chatgpt_fallback, stats)
+    slots = translate_from_cache(queue, slots, fallback_stage, stats)
+    total = len(slots)
+    batches = pack_batches(slots, queue.texts.__getitem__, BATCH_SIZE, BATCH_MAX_CHARS, long_text_size=LONG_TEXT_CHARS)
     total_batches = len(batches)
 
-    print(f"🔄 Starting parallel batch translation: {total} elements in {total_batches} batches with {NUM_WORKERS} workers...")
+    primary_limiter, _ = get_backend_limits(PRIMARY_BACKEND)
+    print(f"🔄 Starting parallel batch translation: {total} elements in {total_batches} batches "
+          f"with up to {primary_limiter.maximum} workers ({primary_limiter.describe()})...")
 
-    with ThreadPoolExecutor(max_workers=NUM_WORKERS) as executor:
+    with ThreadPoolExecutor(max_workers=primary_limiter.maximum) as executor:
         future_to_index = {
-            executor.submit(batch_translate_worker, batch, idx + 1, total_batches, use_chatgpt_fallback)
+            executor.submit(batch_translate_worker, queue, batch, idx + 1, total_batches, fallback_stage, stats): idx
             for idx, batch in enumerate(batches)
         }
 
         for i, future in enumerate(as_completed(future_to_index), 1):
             try:
-                batch_result = future.result()
-                results.extend(batch_result)
+                future.result()
             except Exception as e:
                 print(f"[ERROR] ❌ Batch {future_to_index[future]+1} failed in thread pool: {e}")
 
             pct = round((i / total_batches) * 100, 1)
-            print(f"   📊 {pct}% of batches completed ({i}/{total_batches})")
+            print(f"   📊 {pct}% of batches completed ({i}/{total_batches}) — {primary_limiter.describe()}")
 
+    fallback_stage.close()
     print("✅ All parallel batches completed.")
-    return results
 
-def batch_translate_with_chatgpt(texts: List[str], max_retries: int = 5) -> List[str]:
-    all_results = []
 
-    for i in range(0, len(texts), BATCH_SIZE_CHATGPT):
-        batch = texts[i:i+BATCH_SIZE_CHATGPT]
-        attempt = 0
-        while attempt < max_retries:
+def batch_translate_with_backend(texts: List[str], backend: TranslationBackend, max_retries: int = 5, stats=None) -> List[str]:
+    """
+    Translate texts with a fallback backend in batches of at most BATCH_SIZE_CHATGPT texts and
+    BATCH_MAX_TOKENS_CHATGPT estimated tokens, retrying and splitting failed batches.
+    """
+    all_results = [None] * len(texts)
+    batches = pack_batches(range(len(texts)), lambda i: texts[i], BATCH_SIZE_CHATGPT, BATCH_MAX_TOKENS_CHATGPT,
+                           estimate_tokens, LONG_TEXT_CHARS)
+
+    for n, batch in enumerate(batches, 1):
+        batch_texts = [texts[i] for i in batch]
+        print(f"🧠 {backend.label} batch {n}/{len(batches)}: {len(batch)} texts, "
+              f"~{sum(map(estimate_tokens, batch_texts))} tokens")
+        translated = translate_with_split(backend, batch_texts, max_retries, stats)
+        for i, result in zip(batch, translated):
+            all_results[i] = result or ""
+
+    return all_results
+
+
+
+# ================= FALLBACK ROUTING ================= #
+
+# All-caps / digit tokens such as "HD", "4K", "USA", "S01E05" or "RTS1"; see is_code_like
+CODE_LIKE_RE = re.compile(r"[A-Z0-9][A-Z0-9+&./:#'-]{0,7}")
+# Longer tokens must contain a digit, so all-caps words like "DNEVNIK" or "VIJESTI" are not codes
+CODE_MAX_CHARS_WITHOUT_DIGIT = 3
+KNOWN_IDENTITY_MAX_CHARS = 100
+
+# Script of the target languages not written in the Latin alphabet (by unicodedata name prefix)
+TARGET_SCRIPTS = {
+    'ru': 'CYRILLIC', 'uk': 'CYRILLIC', 'bg': 'CYRILLIC', 'mk': 'CYRILLIC', 'be': 'CYRILLIC',
+    'el': 'GREEK', 'ar': 'ARABIC', 'fa': 'ARABIC', 'he': 'HEBREW', 'iw': 'HEBREW',
+    'hi': 'DEVANAGARI', 'th': 'THAI', 'ka': 'GEORGIAN', 'hy': 'ARMENIAN', 'ko': 'HANGUL',
+}
+# Targets written in several scripts, for which the script rule is not used
+MIXED_SCRIPT_TARGETS = {'sr', 'zh', 'zh-cn', 'zh-tw', 'ja'}
+
+_known_identities = None  # (target language, texts) of the loaded KNOWN_IDENTITY_FILE
+_known_identities_lock = threading.Lock()
+
+
+@lru_cache(maxsize=4096)
+def char_script(char):
+    return unicodedata.name(char, '').split(' ', 1)[0]
+
+
+def in_target_script(text):
+    """True if every letter of text is written in the script of TARGET_LANGUAGE."""
+    target = TARGET_LANGUAGE.lower()
+    if target in MIXED_SCRIPT_TARGETS:
+        return False
+    script = TARGET_SCRIPTS.get(target.split('-')[0], 'LATIN')
+    letters = [c for c in text if c.isalpha()]
+    return bool(letters) and all(char_script(c) == script for c in letters)
+
+
+def get_known_identities():
+    """
+    Texts known to need no translation into TARGET_LANGUAGE, loaded from KNOWN_IDENTITY_FILE on first use
+    (and again if the target changes). Each line of the file is a JSON object {"target": ..., "text": ...};
+    lines for other targets and lines that cannot be read are skipped.
+    """
+    global _known_identities
+    target = TARGET_LANGUAGE.lower()
+    with _known_identities_lock:
+        if _known_identities is None or _known_identities[0] != target:
+            texts = set()
+            if KNOWN_IDENTITY_FILE and os.path.exists(KNOWN_IDENTITY_FILE):
+                with open(KNOWN_IDENTITY_FILE, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            continue
+                        if isinstance(entry, dict) and entry.get('target') == target and entry.get('text'):
+                            texts.add(entry['text'])
+            _known_identities = (target, texts)
+        return _known_identities[1]
+
+
+def learn_identities(texts):
+    """Remember texts the fallback backend returned unchanged into TARGET_LANGUAGE, appending new ones to KNOWN_IDENTITY_FILE."""
+    known = get_known_identities()
+    target = TARGET_LANGUAGE.lower()
+    with _known_identities_lock:
+        new = [text for text in dict.fromkeys(texts) if text not in known and len(text) <= KNOWN_IDENTITY_MAX_CHARS]
+        if not new:
+            return
+        known.update(new)
+        if KNOWN_IDENTITY_FILE:
+            try:
+                with open(KNOWN_IDENTITY_FILE, 'ab') as f:
+                    unterminated = f.tell() > 0
+                if unterminated:
+                    with open(KNOWN_IDENTITY_FILE, 'rb') as f:
+                        f.seek(-1, os.SEEK_END)
+                        unterminated = f.read(1) != b'\n'
+                with open(KNOWN_IDENTITY_FILE, 'a', encoding='utf-8') as f:
+                    if unterminated:  # start on a new line if the last one was cut short
+                        f.write('\n')
+                    f.writelines(json.dumps({'target': target, 'text': text}, ensure_ascii=False) + '\n' for text in new)
+            except OSError as e:
+                print(f"[WARN] Could not update {KNOWN_IDENTITY_FILE}: {e}")
+
+
+def is_code_like(text):
+    """True for texts without letters (numbers, dates, "16+") and codes like "HD", "USA", "S01E05" or "RTS1"."""
+    if not any(c.isalpha() for c in text):
+        return True
+    return (CODE_LIKE_RE.fullmatch(text) is not None
+            and (len(text) <= CODE_MAX_CHARS_WITHOUT_DIGIT or any(c.isdigit() for c in text)))
+
+
+def is_untranslated_target_text(text):
+    """True if text is written in the script of TARGET_LANGUAGE and detected as it or as one of SKIP_LANGUAGES."""
+    if not in_target_script(text):
+        return False
+    lang = detect_language(text)
+    return lang is not None and (lang == TARGET_LANGUAGE.lower() or lang in SKIP_LANGUAGES)
+
+
+def identity_rule(text):
+    """
+    Name of the FALLBACK_ROUTING rule saying text needs no translation, or None.
+
+    - code: no letters at all (numbers, dates, ratings like "16+"), a code of up to
+      CODE_MAX_CHARS_WITHOUT_DIGIT characters like "HD" or "USA", or one with digits like "S01E05"
+    - known: listed in KNOWN_IDENTITY_FILE for TARGET_LANGUAGE, which collects texts the fallback backend returned unchanged
+    - script: written in the script of TARGET_LANGUAGE and detected as TARGET_LANGUAGE or one of
+      SKIP_LANGUAGES, e.g. an English title for an English target. The script alone is not enough:
+      Serbian Latin, Croatian or Turkish texts share the alphabet of English and still need translating.
+    """
+    if 'code' in FALLBACK_ROUTING and is_code_like(text):
+        return 'code'
+    if 'known' in FALLBACK_ROUTING and text in get_known_identities():
+        return 'known'
+    if 'script' in FALLBACK_ROUTING and is_untranslated_target_text(text):
+        return 'script'
+    return None
+
+
+class FallbackStage:
+    """
+    Fallback step of one batch_translate_with_fallback run, pipelined with the primary batches.
+
+    Primary workers submit() the slots they could not translate and move on to their next batch.
+    Submitted texts are first looked up in the fallback cache; the rest are buffered across all
+    primary batches and sent to the fallback backend in full batches (BATCH_SIZE_CHATGPT texts or
+    BATCH_MAX_TOKENS_CHATGPT tokens) by a pool of its own, sized by the fallback backend's limits.
+    close() sends what is left in the buffer and waits for all fallback batches.
+    """
+
+    def __init__(self, queue, use_fallback, stats=None):
+        self.queue = queue
+        self.stats = stats
+        self.enabled = use_fallback and fallback_backend_enabled()
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._buffer_tokens = 0
+        self._futures = []
+        self._executor = None
+        self.routed = Counter()
+        self.routed_chars = 0
+        if self.enabled:
+            self.backend = get_backend(FALLBACK_BACKEND)
+            limiter, _ = get_backend_limits(self.backend.name)
+            self._executor = ThreadPoolExecutor(max_workers=limiter.maximum)
+
+    def route(self, slots):
+        """
+        Keep texts the primary backend returned unchanged away from the paid fallback backend
+        when identity_rule says they need no translation. Those keep their original text;
+        returns the slots still to submit().
+        """
+        if not self.enabled or not FALLBACK_ROUTING:
+            return slots
+        queue = self.queue
+        remaining = []
+        routed = []
+        for slot in slots:
+            rule = identity_rule(queue.texts[slot])
+            if rule is None:
+                remaining.append(slot)
+            else:
+                routed.append(slot)
+                with self._lock:
+                    self.routed[rule] += 1
+                    self.routed_chars += len(queue.texts[slot])
+        queue.finish(routed)
+        return remaining
+
+    def submit(self, slots):
+        """Queue slots for fallback translation; returns without waiting for them."""
+        queue = self.queue
+        if not self.enabled:
+            print("⚠️ Fallback is disabled. Using original text.")
+            for slot in slots:
+                original_text = queue.texts[slot]
+                queue.results[slot] = f"{original_text} / {original_text}"
+            return
+
+        cache = get_translation_cache()
+        cached = cache.get_many([queue.texts[slot] for slot in slots], TARGET_LANGUAGE, self.backend.name) if cache else {}
+        pending = []
+        finished = []
+        unchanged = []
+        for slot in slots:
+            original_text = queue.texts[slot]
+            translated = cached.get(original_text)
+            if translated is None:
+                pending.append(slot)
+                continue
+            if translated != original_text:
+                queue.results[slot] = f"{translated} / {original_text}"
+            else:
+                unchanged.append(original_text)
+            finished.append(slot)
+        queue.finish(finished)
+        learn_identities(unchanged)
+        if cache is not None:
+            bump_stat(self.stats, 'fallback_cache_hits', len(slots) - len(pending))
+            bump_stat(self.stats, 'fallback_cache_misses', len(pending))
+
+        with self._lock:
+            self._buffer.extend(pending)
+            self._buffer_tokens += sum(estimate_tokens(queue.texts[slot]) for slot in pending)
+            if len(self._buffer) >= BATCH_SIZE_CHATGPT or self._buffer_tokens >= BATCH_MAX_TOKENS_CHATGPT:
+                self._dispatch()
+
+    def _dispatch(self):
+        """Hand the buffered slots to the fallback pool (called with the lock held)."""
+        if self._buffer:
+            self._futures.append(self._executor.submit(self._translate, self._buffer))
+            self._buffer = []
+            self._buffer_tokens = 0
+
+    def _translate(self, slots):
+        queue = self.queue
+        texts = [queue.texts[slot] for slot in slots]
+        print(f"🧠 {self.backend.label} fallback processing {len(texts)} items (estimated cost ${self.backend.estimate_cost(texts):.4f})...")
+        translations = batch_translate_with_backend(texts, self.backend, max_retries=5, stats=self.stats)
+        cache = get_translation_cache()
+        if cache is not None:
+            cache.put_many(zip(texts, translations), TARGET_LANGUAGE, self.backend.name)
+
+        finished = []
+        for slot, original_text, translated in zip(slots, texts, translations):
+            if translated and translated != original_text:
+                queue.results[slot] = f"{translated} / {original_text}"
+            if translated:
+                finished.append(slot)
+        queue.finish(finished)
+        learn_identities([text for text, translated in zip(texts, translations) if translated == text])
+
+    def close(self):
+        """Send the remaining buffered slots and wait for every fallback batch to finish."""
+        if self._executor is None:
+            return
+        self.report_routing()
+        with self._lock:
+            self._dispatch()
+            futures = list(self._futures)
+        if futures:
+            print(f"⏳ Waiting for {sum(not f.done() for f in futures)} of {len(futures)} fallback batches...")
+        for future in futures:
             try:
-                attempt += 1
-                print(f"🧠 ChatGPT batch translation attempt {attempt}/{max_retries} (batch {i//BATCH_SIZE_CHATGPT + 1})")
-                translator = ChatGptTranslator(api_key=OPENAI_KEY, target='en')
-                translated = translator.translate_batch(batch)
-                all_results.extend(translated)
-                break  # success, go to next batch
+                future.result()
             except Exception as e:
-                print(f"[ERROR] ❌ ChatGPT batch translation failed (attempt {attempt}/{max_retries}): {e}")
-                if attempt >= max_retries:
-                    print("    ⛔ Max retries reached for this batch. Returning empty results.")
-                    all_results.extend([""] * len(batch))
-                    break
-                time.sleep(2 * attempt)  # exponential backoff
+                print(f"[ERROR] Failed fallback batch: {e}")
+        self._executor.shutdown()
+
+    def report_routing(self):
+        """Print and record the fallback volume avoided by route()."""
+        routed = sum(self.routed.values())
+        if not routed:
+            return
+        for rule, count in self.routed.items():
+            bump_stat(self.stats, f'fallback_routed_{rule}', count)
+        bump_stat(self.stats, 'fallback_routed', routed)
+        bump_stat(self.stats, 'fallback_routed_chars', self.routed_chars)
+        rules = ', '.join(f"{count} {rule}" for rule, count in self.routed.most_common())
+        print(f"🚦 Kept {routed} texts ({self.routed_chars} chars, ~${self.backend.cost_per_char * self.routed_chars:.4f}) "
+              f"away from {self.backend.label} as needing no translation: {rules}")
+
+
+# ================= CHECKPOINTS ================= #
+
+class Checkpoint:
+    """
+    Append-only record of the texts of one source whose translation is final, so that a run
+    interrupted by a crash or an outage can resume where it stopped.
+
+    The first line holds the settings the results depend on (a mismatch discards the file); each
+    following line is a JSON list of [text, result] pairs written as a batch completes, where a
+    null result keeps the original text. Lines that cannot be read, such as a last line cut short
+    by the interruption, are skipped, and the file is truncated after its last complete line before
+    new batches are appended to it.
+    """
 
-    return all_results
+    def __init__(self, path, settings):
+        self.path = path
+        self.settings = settings
+        self.results = {}
+        self._resumable = False
+        self._valid_size = 0  # offset just after the last line that could be read
+        self._unterminated = False  # that line was read but lacks its newline
+        self._file = None
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'rb') as f:
+                header = f.readline()
+                if json.loads(header or b'null') != self.settings:
+                    print(f"⚠️ Ignoring checkpoint {self.path}: it was written with different translation settings")
+                    return
+                offset = self._valid_size = len(header)
+                for line in f:
+                    offset += len(line)
+                    try:
+                        self.results.update(json.loads(line))
+                    except ValueError:
+                        continue
+                    self._valid_size = offset
+                    self._unterminated = not line.endswith(b'\n')
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"[WARN] Ignoring unreadable checkpoint {self.path}: {e}")
+            self.results = {}
+            return
+        self._resumable = True
+
+    def record(self, pairs):
+        """Append the final results of one batch."""
+        line = json.dumps(pairs, ensure_ascii=False) + '\n'
+        with self._lock:
+            if self._file is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                if self._resumable:
+                    # Drop a partial last line, so the next batch does not get glued onto it
+                    os.truncate(self.path, self._valid_size)
+                    self._file = open(self.path, 'a', encoding='utf-8')
+                    if self._unterminated:
+                        self._file.write('\n')
+                else:
+                    self._file = open(self.path, 'w', encoding='utf-8')
+                    self._file.write(json.dumps(self.settings) + '\n')
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self, complete):
+        """Close the file, removing it once the source is completely translated."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        if complete and self.path.exists():
+            os.remove(self.path)
+            with contextlib.suppress(OSError):
+                self.path.parent.rmdir()  # only succeeds once no other source has a checkpoint
+
+
+_checkpoints = {}
+_checkpoints_lock = threading.Lock()
+
+
+def open_checkpoint(source, out_path, use_fallback):
+    """Load (or start) the checkpoint of a source in CHECKPOINT_FOLDER. Returns None when checkpoints are disabled."""
+    if not CHECKPOINT_FOLDER:
+        return None
+    settings = {'target': TARGET_LANGUAGE, 'primary': PRIMARY_BACKEND, 'fallback': FALLBACK_BACKEND if use_fallback else ''}
+    checkpoint = Checkpoint(Path(CHECKPOINT_FOLDER) / f"{out_path.name}.checkpoint.jsonl", settings)
+    if checkpoint.results:
+        print(f"⏯️ Resuming {source} from {checkpoint.path}: {len(checkpoint.results)} texts already translated")
+    with _checkpoints_lock:
+        _checkpoints[source] = checkpoint
+    return checkpoint
 
-            
-def flush_fallback_queue(fallback_queue, results_list, use_chatgpt_fallback):
-    if not use_chatgpt_fallback:
-        print("⚠️ ChatGPT fallback is disabled. Using original text.")
-        for idx, original_text, (elem, _) in fallback_queue:
-            results_list[idx] = (elem, f"{original_text} / {original_text}")
-        fallback_queue.clear()
-        return
 
+def get_checkpoint(source):
+    with _checkpoints_lock:
+        return _checkpoints.get(source)
+
+
+def close_checkpoint(source, complete):
+    with _checkpoints_lock:
+        checkpoint = _checkpoints.pop(source, None)
+    if checkpoint is not None:
+        checkpoint.close(complete)
+
+
+# Source-level scheduling uses download_slots and translation_slots (see configure): separate
+# limits for network downloads and for translation work
+
+
+def get_output_path(source, is_url):
+    """Path in OUTPUT_FOLDER the translated version of a source is written to."""
+    filename = get_filename_from_url(source) if is_url else get_filename_from_path(source)
+    return Path(OUTPUT_FOLDER) / filename
+
+
+def get_download_path(source):
+    """Path in DOWNLOAD_FOLDER the last download of a remote source is kept at, or None if not kept."""
+    if not DOWNLOAD_FOLDER:
+        return None
+    return Path(DOWNLOAD_FOLDER) / get_filename_from_url(source)
+
+
+def output_covers_window(source, out_path):
+    """True if the previous output of a source still covers at least half of its look-ahead window."""
+    try:
+        age_hours = (time.time() - os.path.getmtime(out_path)) / 3600
+    except OSError:
+        return False
+    return age_hours < get_window_policy(source).lookahead_hours / 2
+
+
+def fetch_source(source, is_url, out_path):
+    """
+    Make a source available as a local file: returns (status, xml_path, validators).
+    Download size and time are recorded in the source's metrics.
+
+    Remote feeds are streamed while holding one of the MAX_CONCURRENT_DOWNLOADS slots, to their
+    kept copy in DOWNLOAD_FOLDER or, if it is empty, to a temporary file removed by the caller.
+    A feed the server reports as unchanged is not transferred again: its kept copy is returned,
+    so that it is filtered and translated again for the current time window. Without a kept copy,
+    the status is DOWNLOAD_NOT_MODIFIED and xml_path None, which only happens while the previous
+    output still covers half of the window. xml_path is None as well when the download failed.
+    """
+    if not is_url:
+        if not os.path.exists(source):
+            print(f"[ERROR] Failed to read local file {source}: file not found")
+            return DOWNLOAD_FAILED, None, None
+        return DOWNLOAD_OK, source, None
+
+    kept_path = get_download_path(source)
+    if kept_path is not None:
+        kept_path.parent.mkdir(parents=True, exist_ok=True)
+        conditional = kept_path.exists()
+    else:
+        conditional = output_covers_window(source, out_path)
+    fd, download_path = tempfile.mkstemp(suffix='.xml', dir=kept_path.parent if kept_path is not None else None)
+    os.close(fd)
+    stats = source_stats(source)
+    with download_slots, timed(stats, 'download'):
+        status, validators = download_xml_to_file(source, download_path, conditional=conditional)
+    if status != DOWNLOAD_OK:
+        os.remove(download_path)
+        if status == DOWNLOAD_NOT_MODIFIED:
+            stats['not_modified'] = 1
+            if kept_path is not None:
+                return DOWNLOAD_OK, str(kept_path), None
+        return status, None, validators
+    bump_stat(stats, 'download_bytes', os.path.getsize(download_path))
+    if kept_path is not None:
+        os.replace(download_path, kept_path)
+        download_path = str(kept_path)
+    return status, download_path, validators
+
+
+def process_source(source, is_url, allowed_channel_ids, fallback_settings, fetched=None):
+    """
+    Fetch one EPG source (URL or local path), translate it and save it to OUTPUT_FOLDER.
+
+    Downloads hold one of the MAX_CONCURRENT_DOWNLOADS slots and parsing, translation and
+    writing hold one of the MAX_CONCURRENT_TRANSLATIONS slots, so several sources can be
+    downloading while others are being translated. Remote feeds the server reports as unchanged
+    are translated again from their kept copy (see fetch_source), without downloading them.
+    fetched is the result of an earlier fetch_source call.
+    """
+    out_path = get_output_path(source, is_url)
+    stats = source_stats(source)
+    status, xml_path, validators = fetched or fetch_source(source, is_url, out_path)
+    if status == DOWNLOAD_NOT_MODIFIED:
+        print(f"⏭️ {source} has not changed since the last run, keeping: {out_path}")
+        return True
+    if status != DOWNLOAD_OK:
+        return False
+    if stats.get('not_modified'):
+        print(f"⏭️ {source} has not changed since the last run, translating the kept copy again: {xml_path}")
+
+    complete = False
+    open_checkpoint(source, out_path, should_use_chatgpt_fallback(source, fallback_settings or {}))
     try:
-        indices, texts, elem_pairs = zip(*fallback_queue)
-        print(f"🧠 ChatGPT fallback processing {len(texts)} items...")
-        translations = batch_translate_with_chatgpt(list(texts), max_retries=5)
-
-        for i, (idx, translated, (elem, _)) in enumerate(zip(indices, translations, elem_pairs)):
-            original_text = texts[i]
-            if translated and translated != original_text.strip():
-                formatted = f"{translated} / {original_text}"
-                results_list[idx] = (elem, formatted)
+        with translation_slots, timed(stats, 'process'):
+            policy = get_window_policy(source)
+            previous = load_previous_translations(out_path, policy.fields) if INCREMENTAL_MODE else None
+            if SHARD_PROCESSES > 1:
+                if not translate_xml_sharded(xml_path, out_path, allowed_channel_ids, source, fallback_settings, previous, stats, policy):
+                    return False
+            elif STREAMING_MODE:
+                if not translate_xml_stream(xml_path, out_path, allowed_channel_ids, source, fallback_settings, previous, stats, policy):
+                    return False
             else:
-                results_list[idx] = (elem, None)
-    except Exception as e:
-        print(f"[ERROR] Failed ChatGPT fallback batch: {e}")
-        for idx, (_, _, (elem, _)) in enumerate(fallback_queue):
-            results_list[idx] = (elem, None)
+                with timed(stats, 'read'):
+                    xml_data = read_local_xml(xml_path)
+                if not xml_data:
+                    return False
+                translated_xml = translate_xml_content(xml_data, allowed_channel_ids=allowed_channel_ids, log_source_name=source, fallback_settings=fallback_settings, previous=previous, stats=stats, policy=policy)
+                del xml_data
+                if translated_xml is None:
+                    return False
+                # Written next to the output and renamed, so readers never see a half-written file
+                tmp_path = f"{out_path}.part"
+                with timed(stats, 'write'), open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(translated_xml)
+                os.replace(tmp_path, out_path)
+        complete = not stats.get('untranslated')
+    finally:
+        close_checkpoint(source, complete)
+        if is_url and get_download_path(source) is None:
+            os.remove(xml_path)
+
+    bump_stat(stats, 'output_bytes', os.path.getsize(out_path))
+
+    print(f"✅ Saved translated XML to: {out_path}")
+    if not complete:
+        # Not marked as up to date, so the next run translates the rest from the checkpoint
+        print(f"⚠️ {out_path} is only partially translated: {stats['untranslated']} texts kept their original text")
+        return True
+    if is_url:
+        remember_download_validators(source, validators)
+    return True
+
+
+def run_profiled(out_path, func, *func_args):
+    """Run func under cProfile, print the most expensive calls and save the profile as <output>.prof."""
+    import cProfile
+    import pstats
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *func_args)
     finally:
-        fallback_queue.clear()
+        profile_path = f"{out_path}.prof"
+        profiler.dump_stats(profile_path)
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(25)
+        print(f"🔬 Profile saved to {profile_path} (translation requests run in worker threads and only show up as waits)")
 
 
+def run_source_job(job, fetched=None):
+    """Announce and process one scheduled source. job is (label, source, is_url, allowed_channel_ids, fallback_settings)."""
+    label, source, is_url, allowed_channel_ids, fallback_settings = job
+    print(f"\n{label} {'Downloading' if is_url and not fetched else 'Reading'}: {source}")
+    ok = False
+    try:
+        if PROFILE_SOURCE == source:
+            ok = run_profiled(get_output_path(source, is_url), process_source, source, is_url, allowed_channel_ids, fallback_settings, fetched)
+        else:
+            ok = process_source(source, is_url, allowed_channel_ids, fallback_settings, fetched)
+    except Exception as e:
+        print(f"[ERROR] ❌ Unexpected failure while processing {source}: {e}")
+    record_source_metrics(source, ok)
+    return ok
+
+
+def run_source_jobs(jobs, fetched=None):
+    """
+    Run source jobs concurrently; the download and translation slots bound the actual parallelism.
+    fetched maps sources that were already fetched (see prefetch_sources) to their fetch_source result.
+    """
+    if not jobs:
+        return 0
+    fetched = fetched or {}
+
+    start = time.time()
+    max_workers = max(1, MAX_CONCURRENT_DOWNLOADS + MAX_CONCURRENT_TRANSLATIONS)
+    print(f"\n🚦 Processing {len(jobs)} sources with up to {MAX_CONCURRENT_DOWNLOADS} concurrent downloads "
+          f"and {MAX_CONCURRENT_TRANSLATIONS} concurrent translations...")
+
+    succeeded = 0
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(jobs))) as executor:
+        for ok in executor.map(lambda job: run_source_job(job, fetched.get(job[1])), jobs):
+            succeeded += bool(ok)
+
+    print(f"\n🏁 {succeeded}/{len(jobs)} sources processed in {time.time() - start:.1f}s")
+    return succeeded
 
 
     
-def main():
-    Path(OUTPUT_FOLDER).mkdir(parents=True, exist_ok=True)
+# ================= CROSS-SOURCE SHARING ================= #
+
+# (normalized text, use_fallback) -> translated text, filled by share_common_translations before any source runs
+_shared_translations = {}
+
+
+def iter_top_level(path):
+    """Yield (root, element) for every complete top-level element of an XML file, releasing each one afterwards."""
+    root = None
+    depth = 0
+    with open_xml_file(path) as xml_file:
+        for event, elem in ET.iterparse(xml_file, events=('start', 'end')):
+            if event == 'start':
+                if root is None:
+                    root = elem
+                depth += 1
+                continue
+            depth -= 1
+            if depth == 1:
+                yield root, elem
+                root.clear()
+
+
+def scan_source_texts(xml_path, allowed_channel_ids, policy, previous=None):
+    """Set of normalized texts a source would send for translation, using the same filters as translating it."""
+    classifier = LanguageClassifier() if LANGUAGE_DETECTION else None
+    texts = set()
+    for _, elem in iter_top_level(xml_path):
+        if keep_top_level(elem.tag, elem.attrib, allowed_channel_ids, policy):
+            texts.update(normalize_text(child.text) for child in collect_translatable(elem, policy, previous, None, classifier))
+    texts.discard("")
+    return texts
+
 
+def prefetch_sources(jobs):
+    """Fetch every scheduled source before translating any of them. Returns {source: fetch_source result}."""
+    print(f"\n📥 Fetching {len(jobs)} sources before looking for texts they share...")
+    with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_DOWNLOADS, len(jobs))) as executor:
+        results = executor.map(lambda job: fetch_source(job[1], job[2], get_output_path(job[1], job[2])), jobs)
+        return {job[1]: result for job, result in zip(jobs, results)}
+
+
+def share_common_translations(jobs, fetched):
+    """
+    Translate the texts found in more than one source once, before the sources are processed.
+
+    Providers often publish the same channels in several files, so the same titles and
+    descriptions turn up in several feeds. Every source is scanned with its own channel filter
+    and time window; texts present in at least two of them are translated here and then reused
+    by each source (see translate_elements) instead of being sent again. Texts are shared only
+    between sources with the same fallback setting.
+    """
+    counts = Counter()
+    for _, source, is_url, allowed_channel_ids, fallback_settings in jobs:
+        status, xml_path, _ = fetched.get(source, (DOWNLOAD_FAILED, None, None))
+        if xml_path is None:
+            continue
+        use_fallback = should_use_chatgpt_fallback(source, fallback_settings or {})
+        out_path = get_output_path(source, is_url)
+        policy = get_window_policy(source)
+        previous = load_previous_translations(out_path, policy.fields) if INCREMENTAL_MODE else None
+        try:
+            texts = scan_source_texts(xml_path, allowed_channel_ids, policy, previous)
+        except Exception as e:
+            print(f"[WARN] Could not scan {source} for shared texts: {e}")
+            continue
+        counts.update((text, use_fallback) for text in texts)
+
+    for use_fallback in (False, True):
+        shared = [text for (text, fallback), n in counts.items() if fallback == use_fallback and n > 1]
+        if not shared:
+            continue
+        occurrences = sum(counts[(text, use_fallback)] for text in shared)
+        print(f"\n🔗 {len(shared)} texts appear in more than one source ({occurrences} occurrences), translating them once...")
+        # Texts that could not be translated are left out, so each source retries them and records them as untranslated
+        translated = translate_texts(shared, use_fallback, "texts shared between sources")
+        _shared_translations.update(((text, use_fallback), result) for text, result in translated.items())
+
+
+def merge_outputs(paths, merged_path):
+    """
+    Merge translated XMLTV files into a single one.
+
+    Channels are written first and deduplicated by id, then programmes, deduplicated by
+    (channel, start); the first file containing a channel or programme wins. The root element
+    is taken from the first file. Returns True on success.
+    """
+    tmp_path = f"{merged_path}.part"
+    seen_channels = set()
+    seen_programmes = set()
+    root_tag = None
+    try:
+        Path(merged_path).parent.mkdir(parents=True, exist_ok=True)
+        with open(tmp_path, 'wb') as out:
+            for tag in ('channel', 'programme'):
+                for path in paths:
+                    for root, elem in iter_top_level(path):
+                        if root_tag is None:
+                            root_tag = root.tag
+                            attrs = ''.join(f" {k}={quoteattr(v)}" for k, v in root.attrib.items())
+                            out.write(f"<{root_tag}{attrs}>\n".encode('utf-8'))
+                        if elem.tag != tag:
+                            continue
+                        if tag == 'channel':
+                            key, seen = elem.attrib.get('id'), seen_channels
+                        else:
+                            key, seen = (elem.attrib.get('channel'), elem.attrib.get('start')), seen_programmes
+                        if key in seen:
+                            continue
+                        seen.add(key)
+                        elem.tail = '\n'
+                        out.write(ET.tostring(elem, encoding='utf-8', xml_declaration=False))
+            if root_tag is None:
+                raise ValueError("no elements to merge")
+            out.write(f"</{root_tag}>".encode('utf-8'))
+        os.replace(tmp_path, merged_path)
+    except Exception as e:
+        print(f"[ERROR] Failed to write merged XML {merged_path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+
+    print(f"🧩 Merged {len(paths)} files into {merged_path}: {len(seen_channels)} channels, {len(seen_programmes)} programmes")
+    return True
+
+
+def build_source_jobs():
+    """Read the URL / path lists and filter files and return the source jobs, in processing order."""
     # Load filters
     url_filters, url_fallback_settings = load_channel_filters(URL_FILTER_FILE, "URL")
     local_filters, local_fallback_settings = load_channel_filters(LOCAL_FILTER_FILE, "PATH")
@@ -493,63 +2836,206 @@ def main():
         print(f"⚠️ PATH conflict: {conflict} is listed in both {LOCAL_PATHS_FILE} and {LOCAL_FILTER_FILE}. Filtered version will be used.")
     paths_to_translate = [p for p in paths if p not in local_filters]
 
-    # --- Process filtered URLs ---
+    # --- Schedule all sources: filtered URLs, unfiltered URLs, filtered paths, unfiltered paths ---
+    jobs = []
     for i, (url, allowed_channels) in enumerate(url_filters.items(), start=1):
-        print(f"\n🎯 [Filtered URL {i}/{len(url_filters)}] Downloading: {url}")
-        xml_data = download_xml(url)
-        if not xml_data:
-            continue
+        jobs.append((f"🎯 [Filtered URL {i}/{len(url_filters)}]", url, True, allowed_channels, url_fallback_settings))
+    for i, url in enumerate(urls_to_translate, start=1):
+        jobs.append((f"📥 [URL {i}/{len(urls_to_translate)}]", url, True, None, url_fallback_settings))
+    for i, (path, allowed_channels) in enumerate(local_filters.items(), start=1):
+        jobs.append((f"🎯 [Filtered PATH {i}/{len(local_filters)}]", path, False, allowed_channels, local_fallback_settings))
+    for i, path in enumerate(paths_to_translate, start=1):
+        jobs.append((f"📂 [Local {i}/{len(paths_to_translate)}]", path, False, None, local_fallback_settings))
 
-        translated_xml = translate_xml_content(xml_data, allowed_channel_ids=allowed_channels, log_source_name=url, fallback_settings=url_fallback_settings)
-        filename = get_filename_from_url(url)
-        out_path = Path(OUTPUT_FOLDER) / filename
-        with open(out_path, 'w', encoding='utf-8') as f:
-            f.write(translated_xml)
-        print(f"✅ Saved translated XML to: {out_path}")
+    return jobs
 
-    # --- Process unfiltered URLs (full translation) ---
-    for i, url in enumerate(urls_to_translate, start=1):
-        print(f"\n📥 [URL {i}/{len(urls_to_translate)}] Downloading: {url}")
-        xml_data = download_xml(url)
-        if not xml_data:
-            continue
 
-        translated_xml = translate_xml_content(xml_data, allowed_channel_ids=None, log_source_name=url, fallback_settings=url_fallback_settings)
-        filename = get_filename_from_url(url)
-        out_path = Path(OUTPUT_FOLDER) / filename
-        with open(out_path, 'w', encoding='utf-8') as f:
-            f.write(translated_xml)
-        print(f"✅ Saved translated XML to: {out_path}")
+def run_cycle(jobs, all_jobs=None):
+    """
+    Process the given source jobs, then merge outputs and trim the cache.
+    all_jobs are the jobs whose outputs go into MERGED_OUTPUT_FILE (defaults to jobs).
+    """
+    fetched = None
+    _shared_translations.clear()
+    reset_source_stats(source for _, source, _, _, _ in jobs)
+    if CROSS_SOURCE_DEDUP and len(jobs) > 1:
+        fetched = prefetch_sources(jobs)
+        share_common_translations(jobs, fetched)
+
+    run_source_jobs(jobs, fetched)
+
+    # --- Optionally merge all translated files into one ---
+    if MERGED_OUTPUT_FILE:
+        outputs = list(dict.fromkeys(get_output_path(source, is_url) for _, source, is_url, _, _ in all_jobs or jobs))
+        outputs = [path for path in outputs if path.exists()]
+        if outputs:
+            merge_outputs(outputs, MERGED_OUTPUT_FILE)
+        else:
+            print(f"⚠️ No translated files to merge into {MERGED_OUTPUT_FILE}")
 
-   
+    # --- Keep the translation cache within its size limit ---
+    cache = get_translation_cache()
+    if cache is not None:
+        evicted = cache.evict()
+        if evicted:
+            print(f"🧹 Evicted {evicted} least recently used entries from translation cache {TRANSLATION_CACHE_FILE or 'in memory'}")
 
-    # --- Process filtered local files ---
-    for i, (path, allowed_channels) in enumerate(local_filters.items(), start=1):
-        print(f"\n🎯 [Filtered PATH {i}/{len(local_filters)}] Reading: {path}")
-        xml_data = read_local_xml(path)
-        if not xml_data:
-            continue
+    write_prometheus_metrics()
 
-        translated_xml = translate_xml_content(xml_data, allowed_channel_ids=allowed_channels, log_source_name=path, fallback_settings=local_fallback_settings)
-        filename = get_filename_from_path(path)
-        out_path = Path(OUTPUT_FOLDER) / filename
-        with open(out_path, 'w', encoding='utf-8') as f:
-            f.write(translated_xml)
-        print(f"✅ Saved translated XML to: {out_path}")
 
-    # --- Process unfiltered local files (full translation) ---
-    for i, path in enumerate(paths_to_translate, start=1):
-        print(f"\n📂 [Local {i}/{len(paths_to_translate)}] Reading: {path}")
-        xml_data = read_local_xml(path)
-        if not xml_data:
-            continue
+# ================= DAEMON MODE ================= #
+
+def load_refresh_schedule(filepath):
+    """
+    Parses a schedule file like:
+        30 https://example.com/file.xml
+        1440 C:\\EPG\\local.xml
+
+    i.e. a refresh interval in minutes followed by the URL or path it applies to.
+    Sources not listed are refreshed every REFRESH_INTERVAL_MINUTES.
+    """
+    schedule = {}
+    if not filepath or not os.path.exists(filepath):
+        return schedule
+
+    with open(filepath, 'r', encoding='utf-8') as f:
+        for line in f:
+            stripped = line.strip()
+            if not stripped or stripped.startswith('#'):
+                continue
+            minutes, _, source = stripped.partition(' ')
+            try:
+                schedule[source.strip()] = float(minutes)
+            except ValueError:
+                print(f"⚠️ Ignoring invalid line in {filepath}: {stripped}")
+    return schedule
+
+
+def get_mtime(path):
+    """Modification time of a file, or None if it does not exist."""
+    try:
+        return os.stat(path).st_mtime_ns
+    except (OSError, TypeError, ValueError):
+        return None
+
+
+def run_daemon():
+    """
+    Keep running and refresh each source when it is due or, for local files, as soon as it changes.
+
+    Translator clients, HTTP sessions, language detection results, worker processes and the translation
+    cache (in memory if TRANSLATION_CACHE_FILE is empty) stay warm between refreshes. The source
+    lists, filter files and REFRESH_SCHEDULE_FILE are re-read whenever one of them changes.
+    """
+    watched_files = [URL_LIST_FILE, LOCAL_PATHS_FILE, URL_FILTER_FILE, LOCAL_FILTER_FILE, REFRESH_SCHEDULE_FILE]
+    watched_mtimes = None
+    jobs = []
+    schedule = {}
+    next_due = {}
+    source_mtimes = {}
+
+    print(f"🛰️ Daemon mode: refreshing sources every {REFRESH_INTERVAL_MINUTES:g} minutes unless scheduled otherwise "
+          f"in {REFRESH_SCHEDULE_FILE}, checking every {DAEMON_POLL_SECONDS}s. Press Ctrl+C to stop.")
+    try:
+        while True:
+            mtimes = [get_mtime(path) for path in watched_files]
+            if mtimes != watched_mtimes:
+                if watched_mtimes is not None:
+                    print("\n🔄 Source lists or filters changed, reloading them...")
+                jobs = build_source_jobs()
+                schedule = load_refresh_schedule(REFRESH_SCHEDULE_FILE)
+                watched_mtimes = mtimes
+
+            now = time.monotonic()
+            due = []
+            for job in jobs:
+                _, source, is_url, _, _ = job
+                mtime = None if is_url else get_mtime(source)
+                if now >= next_due.get(source, 0):
+                    due.append(job)
+                elif not is_url and mtime != source_mtimes.get(source):
+                    print(f"\n👀 {source} changed on disk")
+                    due.append(job)
+                source_mtimes[source] = mtime
+
+            if due:
+                run_cycle(due, jobs)
+                for _, source, _, _, _ in due:
+                    next_due[source] = time.monotonic() + schedule.get(source, REFRESH_INTERVAL_MINUTES) * 60
+                upcoming = min(next_due.get(source, 0) for _, source, _, _, _ in jobs)
+                print(f"💤 Next scheduled refresh in {max(0, upcoming - time.monotonic()) / 60:.1f} minutes")
+
+            time.sleep(DAEMON_POLL_SECONDS)
+    except KeyboardInterrupt:
+        print("\n👋 Daemon stopped")
+
+
+# ================= PLAN ================= #
+
+def describe_mode():
+    if SHARD_PROCESSES > 1:
+        return f"sharded across {SHARD_PROCESSES} processes"
+    if STREAMING_MODE:
+        return f"streamed in windows of {STREAM_WINDOW_SIZE} elements"
+    return "parsed in memory"
+
+
+def print_plan(jobs):
+    """Report what a run would do, without downloading, parsing or translating anything."""
+    backends = [PRIMARY_BACKEND]
+    if FALLBACK_BACKEND and any(should_use_chatgpt_fallback(source, settings or {}) for _, source, _, _, settings in jobs):
+        backends.append(FALLBACK_BACKEND)
+    print(f"\n📋 Plan: {len(jobs)} sources to {TARGET_LANGUAGE}, {describe_mode()}, "
+          f"backends: {', '.join(backends)}, output: {OUTPUT_FOLDER}")
+    print(f"   {MAX_CONCURRENT_DOWNLOADS} concurrent downloads, {MAX_CONCURRENT_TRANSLATIONS} concurrent translations, "
+          f"cache: {TRANSLATION_CACHE_FILE or 'disabled'}"
+          f"{', incremental' if INCREMENTAL_MODE else ''}{', cross-source sharing' if CROSS_SOURCE_DEDUP else ''}")
+
+    validators = load_download_state()
+    for label, source, is_url, allowed_channel_ids, fallback_settings in jobs:
+        out_path = get_output_path(source, is_url)
+        channels = f"{len(allowed_channel_ids)} channels" if allowed_channel_ids else "all channels"
+        fallback = "fallback" if should_use_chatgpt_fallback(source, fallback_settings or {}) and FALLBACK_BACKEND else "no fallback"
+        if is_url:
+            fetch = "conditional download" if out_path.exists() and validators.get(source) else "download"
+        elif os.path.exists(source):
+            fetch = f"{os.path.getsize(source) / 1e6:.1f} MB"
+        else:
+            fetch = "missing"
+        print(f"{label} {source}\n   {channels}, {get_window_policy(source).describe()}, {fallback}, {fetch} → "
+              f"{out_path}{' (exists)' if out_path.exists() else ''}")
+    if MERGED_OUTPUT_FILE:
+        print(f"🧩 Outputs merged into {MERGED_OUTPUT_FILE}")
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-c", "--config", help="Path to configuration file", default="config.txt")
+    parser.add_argument("--daemon", action="store_true", help="Keep running and refresh sources on a schedule (see REFRESH_INTERVAL_MINUTES)")
+    parser.add_argument("--profile", metavar="SOURCE", help="Profile the processing of this URL or path with cProfile")
+    parser.add_argument("--plan", "--dry-run", action="store_true", help="Read the source lists and filters and print what would be processed, then exit")
+    return parser
+
+
+def main(argv=None):
+    global DAEMON_MODE, PROFILE_SOURCE
+    # ---- Parse CLI arguments and load configuration ---- #
+    args = build_arg_parser().parse_args(argv)
+    configure(load_config(args.config) if os.path.exists(args.config) else {})
+    DAEMON_MODE = args.daemon
+    PROFILE_SOURCE = args.profile
+    if args.plan:
+        print_plan(build_source_jobs())
+        return
 
-        translated_xml = translate_xml_content(xml_data, allowed_channel_ids=None, log_source_name=path, fallback_settings=local_fallback_settings)
-        filename = get_filename_from_path(path)
-        out_path = Path(OUTPUT_FOLDER) / filename
-        with open(out_path, 'w', encoding='utf-8') as f:
-            f.write(translated_xml)
-        print(f"✅ Saved translated XML to: {out_path}")
+    Path(OUTPUT_FOLDER).mkdir(parents=True, exist_ok=True)
+    try:
+        if DAEMON_MODE:
+            run_daemon()
+        else:
+            run_cycle(build_source_jobs())
+    finally:
+        shutdown_shard_pool()
 
 
 if __name__ == '__main__':